@@ -1,21 +1,53 @@
-from fastapi import APIRouter, UploadFile, Form, HTTPException
-from app.models.outline_extractor import ProperPDFExtractor
+from fastapi import (
+    APIRouter, BackgroundTasks, UploadFile, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+)
+from fastapi.responses import Response, StreamingResponse
 from app.models.persona_analyzer import analyze_with_persona
+from app.utils.context_builder import build_context, describe_prompt
+from app.utils.blob_store import (
+    store_and_reference, resolve_reference, release_references, collect_garbage
+)
+from app.utils.document_index import index_session_documents, lookup_document, remove_session_documents
+from app.utils.insight_cache import get_cached_insights, put_cached_insights, normalize_selection
+from app.utils.single_flight import SingleFlight
+from app.utils.cancellation import ClientDisconnected, cancel_on_disconnect
+from app.utils.tts import synthesize_script, tts_settings
+from app.utils.audio_stream import (
+    RangeNotSatisfiable, etag_matches, file_etag, find_part_file, follow_part_file, iter_file_range, parse_range
+)
+from app.utils.audio_cache import AUDIO_DIR, audio_cache_key, audio_path_for, enforce_audio_quota, get_cached_audio
+from app.utils.podcast_jobs import (
+    JobQueueFull, PodcastJobQueue, create_job, finish_job, find_analysis_job, get_job, remove_session_jobs,
+    update_stage, withdraw_queued_job
+)
+from app.utils.resilience import (
+    CircuitOpenError, InvalidResponseError, call_with_retries, get_breaker, record_outcome
+)
+from app.utils.executors import map_in_process, run_in_thread
+from app.utils.outline_cache import SECTION_VECTOR_CACHE, get_cached_extraction, put_cached_extraction
+from app.utils.pdf_pipeline import process_pdf_document
+from app.utils.retrieval_index import (
+    SessionRetrievalIndex, build_session_index, get_session_index, drop_session_index, index_version
+)
+from app.utils.section_candidates import (
+    PRECOMPUTE_SECTION_CANDIDATES, precompute_section_candidates, get_page_candidates,
+    record_fallback, drop_section_candidates
+)
+from app.utils.session_store import create_session_store, SESSION_HISTORY_LIMIT, SESSION_PODCAST_LIMIT
 import json
 from uuid import uuid4
 from pathlib import Path
 from datetime import datetime
 import hashlib
-from openai import AzureOpenAI
+import itertools
+import time
 import os
-from typing import List
+from typing import Awaitable, Callable, List, Optional, Tuple
 from datetime import datetime
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-# Gemini AI Integration
-import google.generativeai as genai
+# Gemini AI Integration (shared async client)
+from app.utils import llm_client
 from dotenv import load_dotenv
 import asyncio
 
@@ -27,37 +59,73 @@ from pathlib import Path
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini AI
-try:
-    gemini_api_key = os.environ.get("GEMINI_API_KEY")
-    if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-        print("Gemini AI configured successfully")
-    else:
-        print("GEMINI_API_KEY not found in environment")
-except Exception as e:
-    print(f"Gemini configuration failed: {e}")
-
 router = APIRouter()
 
-# In-memory session storage (replace with database in production)
-SESSION_STORAGE = {}
+# Identical concurrent selections (same session, page, mode and normalized text) share one analysis
+ANALYSIS_FLIGHTS = SingleFlight("analyze-selection")
+
+# Background podcast generation: bounded worker pool per API worker, status shared through SQLite
+PODCAST_JOBS = PodcastJobQueue("podcast")
+PODCAST_JOB_STAGES = ["script", "audio", "store"]
+
+# Opt-in speculative podcasts: narrate each analysis in the background on a small low-priority pool,
+# so /generate-podcast/ for that analysis_id can attach to the finished or in-flight result.
+# Their Gemini and TTS calls use separate, smaller limits (LLM_BACKGROUND_CONCURRENCY and the
+# "tts_background" stage) instead of the slots interactive requests wait on
+SPECULATIVE_PODCASTS_ENABLED = os.getenv("SPECULATIVE_PODCASTS", "false").lower() == "true"
+SPECULATIVE_PODCASTS = PodcastJobQueue(
+    "speculative-podcast",
+    workers=int(os.getenv("SPECULATIVE_PODCAST_WORKERS", "1")),
+    limit=int(os.getenv("SPECULATIVE_PODCAST_QUEUE_LIMIT", "8"))
+)
+SPECULATIVE_PODCAST_STAGES = ["script", "audio"]
+JOB_POLL_SECONDS = 0.5
+# /generate-podcast/ waits at most this long for an in-flight speculative podcast, then generates directly
+SPECULATIVE_ATTACH_TIMEOUT_SECONDS = float(os.getenv("SPECULATIVE_ATTACH_TIMEOUT_SECONDS", "20"))
+
+# Quiet period before a WebSocket selection is analyzed; a newer selection within it replaces the old one
+SELECTION_DEBOUNCE_SECONDS = float(os.getenv("SELECTION_DEBOUNCE_MS", "350")) / 1000
+
+# Session storage: bounded LRU + TTL store (SQLite by default so sessions survive restarts)
+SESSION_STORAGE = create_session_store()
+
+# Session store calls do SQLite I/O and pickling: call these from handlers via run_in_thread("storage", ...)
+
+def trim_session_lists(data: dict):
+    """Keep long-lived sessions bounded: only the most recent analyses and podcasts are kept"""
+    for key, limit in (("analysis_history", SESSION_HISTORY_LIMIT), ("podcasts", SESSION_PODCAST_LIMIT)):
+        if len(data.get(key, [])) > limit:
+            data[key] = data[key][-limit:]
+
+def update_session_data(session_id: str, change: Callable[[dict], None]) -> Optional[dict]:
+    """
+    Apply change to the stored session atomically (re-read, edit, write back under the store's lock),
+    so concurrent analyses, podcasts and document uploads don't overwrite each other
+    Returns the updated session, or None if it no longer exists
+    """
+    def apply(data: dict):
+        change(data)
+        trim_session_lists(data)
+    data = SESSION_STORAGE.update(session_id, apply)
+    if data is None:
+        print(f"Session {session_id} not found, update skipped")
+    else:
+        print(f"📝 UPDATED session data for {session_id}")
+    return data
 
-def store_session_data(session_id: str, data: dict):
-    """Store session data in memory with enhanced logging"""
-    SESSION_STORAGE[session_id] = data
-    print(f"📝 STORED session data for {session_id}")
-    print(f"📊 Prior docs count: {len(data.get('prior_documents', []))}")
-    print(f"📂 Total sessions now: {len(SESSION_STORAGE)}")
-    
-    # Log sample document IDs for debugging
-    prior_docs = data.get('prior_documents', [])
-    if prior_docs:
-        sample_ids = [doc.get('unique_id', 'NO_ID') for doc in prior_docs[:3]]
-        print(f"📋 Sample document IDs: {sample_ids}")
+def replace_session_data(session_id: str, data: dict) -> dict:
+    """Store data as the whole session atomically and return the session it replaced ({} for a new one)"""
+    replaced = []
+    def swap(previous: dict) -> dict:
+        replaced.append(previous)
+        trim_session_lists(data)
+        return data
+    SESSION_STORAGE.update(session_id, swap, create=True)
+    print(f"📝 STORED session data for {session_id} ({len(data.get('prior_documents', []))} prior docs)")
+    return replaced[0]
 
 def get_session_data(session_id: str) -> dict:
-    """Retrieve session data from memory with enhanced logging"""
+    """Retrieve session data with enhanced logging"""
     data = SESSION_STORAGE.get(session_id, {})
     print(f"📖 RETRIEVED session data for {session_id}")
     print(f"📊 Prior docs found: {len(data.get('prior_documents', []))}")
@@ -68,253 +136,212 @@ def get_session_data(session_id: str) -> dict:
     
     return data
 
-def calculate_similarity(text1: str, text2: str) -> float:
-    """Calculate cosine similarity between two texts"""
-    try:
-        if not text1.strip() or not text2.strip():
-            return 0.0
-        
-        vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-        tfidf_matrix = vectorizer.fit_transform([text1, text2])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-        return float(similarity)
-    except Exception as e:
-        print(f"Similarity calculation error: {e}")
-        return 0.0
-
-def create_document_embeddings(content: bytes, outline: dict) -> dict:
-    """Create embeddings for document sections"""
-    embeddings = {}
-    
-    try:
-        # Convert bytes to string for processing
-        text_content = extract_text_from_bytes(content)
-        
-        # Create section-level embeddings
-        for idx, section in enumerate(outline.get("outline", [])):
-            section_text = section.get("text", "")
-            if section_text:
-                # Simple embedding representation (replace with actual embedding model)
-                embedding_id = f"section_{idx}"
-                embeddings[embedding_id] = {
-                    "text": section_text,
-                    "page": section.get("page", 0),
-                    "level": section.get("level", 1),
-                    "vector": create_simple_vector(section_text)  # Placeholder
-                }
-        
-        print(f"Created {len(embeddings)} embeddings for document sections")
-        return embeddings
-        
-    except Exception as e:
-        print(f"Error creating embeddings: {e}")
-        return {}
-
-def extract_text_from_bytes(content: bytes) -> str:
-    """Extract text content from PDF bytes"""
-    try:
-        # Use your existing PDF text extraction logic
-        extractor = ProperPDFExtractor()
-        outline = extractor.extract_outline(content)
-        
-        # Combine all section texts
-        all_text = []
-        for section in outline.get("outline", []):
-            if section.get("text"):
-                all_text.append(section["text"])
-        
-        return " ".join(all_text)
-    except Exception as e:
-        print(f"Text extraction error: {e}")
-        return ""
-
-def create_simple_vector(text: str) -> list:
-    """Create a simple vector representation of text (placeholder)"""
-    # This is a placeholder - in production, use proper embedding models
-    words = text.lower().split()
-    vector = [len(words), len(set(words)), text.count(' ')]
-    return vector + [0] * (100 - len(vector))  # Pad to fixed size
+def insights_generation_config():
+    """Generation settings for insight completions on the shared Gemini model"""
+    return llm_client.generation_config(
+        temperature=0.7,
+        top_p=0.8,
+        top_k=40,
+        max_output_tokens=2048,
+    )
 
-# ENHANCED GEMINI AI INSIGHTS GENERATION WITH GEMINI 2.5 FLASH
-async def generate_gemini_insights(selected_text: str, relevant_snippets: List[dict]) -> dict:
+def build_insights_prompt(selected_text: str, relevant_snippets: List[dict]) -> Tuple[str, dict]:
     """
-    Generate DEEP, INTELLIGENT insights using Gemini 2.5 Flash with enhanced prompting
+    Deep-analysis prompt over the selection and its top related sections
+    Returns the prompt and its size report (tokens used, snippets packed, duplicates dropped)
     """
-    try:
-        # Initialize Gemini model with better configuration using Gemini 2.5 Flash
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash-exp',  # Updated to use Gemini 2.5 Flash
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=2048,
-            )
-        )
-        
-        # Prepare RICH context from relevant snippets
-        context_analysis = []
-        for snippet in relevant_snippets[:8]:  # Use top 8 snippets for richer context
-            context_analysis.append({
-                "document": snippet["document_name"],
-                "page": snippet.get("page", "Unknown"),
-                "content": snippet["section_text"][:800],  # More content for better context
-                "relevance_score": snippet["similarity_score"],
-                "section_level": snippet.get("section_level", 1)
-            })
-        
-        # Create ADVANCED prompt for deeper analysis
-        enhanced_prompt = f"""
-       ROLE
-        You are an elite research analyst synthesizing a selected text from a current document with related excerpts from a personal document library. Produce extraordinary, deep, and actionable insights that go far beyond surface‑level analysis. Do not mention any model or tool. Do not output JSON.
+    # Prepare RICH context: best non-duplicate snippets packed into the context token budget
+    context_analysis, context_report = build_context(relevant_snippets)
+    
+    # Create ADVANCED prompt for deeper analysis
+    enhanced_prompt = f"""
+   ROLE
+    You are an elite research analyst synthesizing a selected text from a current document with related excerpts from a personal document library. Produce extraordinary, deep, and actionable insights that go far beyond surface‑level analysis. Do not mention any model or tool. Do not output JSON.
+
+    INPUTS
 
-        INPUTS
+    SELECTED TEXT:
+    "{selected_text}"
 
-        SELECTED TEXT:
-        "{selected_text}"
+    RELATED DOCUMENT CONTEXT (JSON):
+    {json.dumps(context_analysis, indent=2)}
 
-        RELATED DOCUMENT CONTEXT (JSON):
-        {json.dumps(context_analysis, indent=2)}
+    OBJECTIVE
+    Deliver a single, cohesive plain‑text response (not JSON, not bullet‑only) that weaves together deep conceptual analysis, cross‑document synthesis, and strategic foresight. The output must read as a polished narrative memo with embedded, specific evidence references (document titles, sections, dates, page numbers if available).
 
-        OBJECTIVE
-        Deliver a single, cohesive plain‑text response (not JSON, not bullet‑only) that weaves together deep conceptual analysis, cross‑document synthesis, and strategic foresight. The output must read as a polished narrative memo with embedded, specific evidence references (document titles, sections, dates, page numbers if available).
+    MANDATORY ANALYSIS DIMENSIONS
+    Cover all of the following, integrating them smoothly into one flowing narrative (not separate headers unless helpful for clarity):
 
-        MANDATORY ANALYSIS DIMENSIONS
-        Cover all of the following, integrating them smoothly into one flowing narrative (not separate headers unless helpful for clarity):
+    Deep conceptual connections: Extract underlying themes, principles, causal mechanisms, and paradigms (not just overlapping keywords). Explain why these concepts matter and how they operate.
 
-        Deep conceptual connections: Extract underlying themes, principles, causal mechanisms, and paradigms (not just overlapping keywords). Explain why these concepts matter and how they operate.
+    Cross‑disciplinary insights: Map ideas to adjacent domains present in the library (e.g., strategy, design, economics, systems, policy, engineering, behavioral science). Show transferability and constraints.
 
-        Cross‑disciplinary insights: Map ideas to adjacent domains present in the library (e.g., strategy, design, economics, systems, policy, engineering, behavioral science). Show transferability and constraints.
+    Evolutionary patterns: Trace how ideas evolved across time in the documents (earliest to latest). Identify shifts in assumptions, metrics, methods, scope, and maturity; explain drivers of change.
 
-        Evolutionary patterns: Trace how ideas evolved across time in the documents (earliest to latest). Identify shifts in assumptions, metrics, methods, scope, and maturity; explain drivers of change.
+    Strategic implications: Translate insights into decision choices, trade‑offs, risks, and opportunities. Specify recommended actions, owner roles, sequencing, and measurable signals to monitor.
 
-        Strategic implications: Translate insights into decision choices, trade‑offs, risks, and opportunities. Specify recommended actions, owner roles, sequencing, and measurable signals to monitor.
+    Hidden relationships: Surface non‑obvious links (shared causal factors, common failure modes, tacit assumptions, second‑order effects). Justify with evidence.
 
-        Hidden relationships: Surface non‑obvious links (shared causal factors, common failure modes, tacit assumptions, second‑order effects). Justify with evidence.
+    Contextual significance: Situate the selected text within the broader knowledge landscape of the library. Clarify what is genuinely novel vs. reiterative; state the marginal contribution.
 
-        Contextual significance: Situate the selected text within the broader knowledge landscape of the library. Clarify what is genuinely novel vs. reiterative; state the marginal contribution.
+    OUTPUT FORMAT (STRICT)
 
-        OUTPUT FORMAT (STRICT)
+    One single plain‑text response (no JSON, no code blocks).
 
-        One single plain‑text response (no JSON, no code blocks).
+    Write as a clear, concise analytical memo with short paragraphs.
 
-        Write as a clear, concise analytical memo with short paragraphs.
+    Every insight must be 2–4 sentences, specific and evidence‑grounded.
 
-        Every insight must be 2–4 sentences, specific and evidence‑grounded.
+    Explicitly reference sources inline: “(Doc: <title or id>, section/page/date if available)”.
 
-        Explicitly reference sources inline: “(Doc: <title or id>, section/page/date if available)”.
+    Include these eight sections as bolded inline labels within the narrative, in this order, but keep the prose continuous (avoid list dumps):
 
-        Include these eight sections as bolded inline labels within the narrative, in this order, but keep the prose continuous (avoid list dumps):
+    Deep similarities
 
-        Deep similarities
+    Strategic contradictions
 
-        Strategic contradictions
+    Evolutionary variations
 
-        Evolutionary variations
+    Critical limitations
 
-        Critical limitations
+    Powerful examples
 
-        Powerful examples
+    Breakthrough connections
 
-        Breakthrough connections
+    Strategic insights
 
-        Strategic insights
+    Knowledge synthesis
 
-        Knowledge synthesis
+    EVIDENCE & RIGOR REQUIREMENTS
 
-        EVIDENCE & RIGOR REQUIREMENTS
+    For each section above, include at least 2 distinct, concrete references to documents from the provided context.
 
-        For each section above, include at least 2 distinct, concrete references to documents from the provided context.
+    When making claims, tie them to direct passages, data points, or figures where possible.
 
-        When making claims, tie them to direct passages, data points, or figures where possible.
+    Prefer causal explanations (“because,” “therefore,” “driven by”) over descriptive summaries.
 
-        Prefer causal explanations (“because,” “therefore,” “driven by”) over descriptive summaries.
+    Translate abstract concepts into operational implications (metrics, thresholds, timelines, owners).
 
-        Translate abstract concepts into operational implications (metrics, thresholds, timelines, owners).
+    If the context is sparse or conflicting, state uncertainty explicitly and show how to resolve it (what to read/measure next).
 
-        If the context is sparse or conflicting, state uncertainty explicitly and show how to resolve it (what to read/measure next).
+    STYLE & TONE
 
-        STYLE & TONE
+    Executive, lucid, and incisive. No fluff. No marketing language.
 
-        Executive, lucid, and incisive. No fluff. No marketing language.
+    Confident, evidence‑led assertions; avoid hedging except to flag genuine uncertainty.
 
-        Confident, evidence‑led assertions; avoid hedging except to flag genuine uncertainty.
+    Avoid enumerated lists unless essential; prefer tight paragraphs.
 
-        Avoid enumerated lists unless essential; prefer tight paragraphs.
+    Do not mention or imply any underlying AI system, tools, chain‑of‑thought, or hidden steps.
 
-        Do not mention or imply any underlying AI system, tools, chain‑of‑thought, or hidden steps.
+    DO not use **
 
-        DO not use **
+    QUALITY BAR (PASS/FAIL)
 
-        QUALITY BAR (PASS/FAIL)
+    Pass only if every section label is present, integrated, and supported by specific document evidence; if any section lacks evidence or actionable implications, revise internally before output.
 
-        Pass only if every section label is present, integrated, and supported by specific document evidence; if any section lacks evidence or actionable implications, revise internally before output.
+    The memo must reveal at least one non‑obvious, high‑leverage insight that would plausibly change a decision or prioritization path.
 
-        The memo must reveal at least one non‑obvious, high‑leverage insight that would plausibly change a decision or prioritization path.
+    The memo must end with a short, decisive closing paragraph that states the single most important next decision and the leading indicator to watch.
 
-        The memo must end with a short, decisive closing paragraph that states the single most important next decision and the leading indicator to watch.
+    BEGIN ANALYSIS NOW
+    Read the selected text and the related document context carefully. Synthesize, reason, and produce the final memo as a single plain‑text response that fully satisfies all requirements above.
+    """
+    prompt_report = describe_prompt(enhanced_prompt, context_report)
+    print(f"🧮 Insight prompt: ~{prompt_report['prompt_tokens']} tokens, "
+          f"{prompt_report['snippets_used']}/{prompt_report['snippets_considered']} snippets "
+          f"({prompt_report['near_duplicates_dropped']} near-duplicates dropped)")
+    return enhanced_prompt, prompt_report
+
+def response_text_of(response) -> str:
+    """Text of a Gemini response across SDK response shapes"""
+    # FIXED: Handle new Gemini 2.5 Flash response format
+    response_text = ""
+    if hasattr(response, 'text'):
+        response_text = response.text
+    elif hasattr(response, 'parts') and response.parts:
+        response_text = ''.join([part.text for part in response.parts if hasattr(part, 'text')])
+    elif hasattr(response, 'candidates') and response.candidates:
+        for candidate in response.candidates:
+            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                response_text += ''.join([part.text for part in candidate.content.parts if hasattr(part, 'text')])
+    return response_text
+
+def parse_insights_text(response_text: str, selected_text: str, attempt: int = 0) -> Optional[dict]:
+    """Insights from a completed Gemini response, or None if it is too short or shallow to use"""
+    if not response_text or len(response_text) <= 100:
+        print(f"Response too short on attempt {attempt + 1}")
+        return None
+
+    # Try to parse as JSON
+    try:
+        insights = json.loads(response_text)
+        print(f"Deep Gemini 2.5 Flash insights generated successfully (attempt {attempt + 1})")
+        
+        # Validate that we have meaningful insights
+        total_insights = sum(len(v) for v in insights.values() if isinstance(v, list))
+        if total_insights > 5:  # Ensure we have substantial content
+            return insights
+        print(f"Insights too shallow, retrying... (attempt {attempt + 1})")
+        return None
+        
+    except json.JSONDecodeError:
+        print(f"JSON parsing failed on attempt {attempt + 1}, extracting from text...")
+        return extract_enhanced_insights_from_text(response_text, selected_text) or None
 
-        BEGIN ANALYSIS NOW
-        Read the selected text and the related document context carefully. Synthesize, reason, and produce the final memo as a single plain‑text response that fully satisfies all requirements above.
-        """
+# ENHANCED GEMINI AI INSIGHTS GENERATION WITH GEMINI 2.5 FLASH
+async def generate_gemini_insights(selected_text: str, relevant_snippets: List[dict],
+                                   prompt_report: Optional[dict] = None) -> dict:
+    """
+    Generate DEEP, INTELLIGENT insights using Gemini 2.5 Flash with enhanced prompting
+    If prompt_report is given it is filled with the prompt size report
+    """
+    try:
+        config = insights_generation_config()
+        enhanced_prompt, report = build_insights_prompt(selected_text, relevant_snippets)
+        if prompt_report is not None:
+            prompt_report.update(report)
         
         print(f"🤖 Generating DEEP Gemini 2.5 Flash insights for: '{selected_text[:60]}...'")
-        print(f"📊 Context: {len(context_analysis)} high-quality document excerpts")
+        print(f"📊 Context: {report['snippets_used']} high-quality document excerpts")
+        
+        # Generate enhanced insights using Gemini 2.5 Flash: failures retry with jittered backoff
+        # behind the Gemini circuit breaker, which fails fast to the fallback while Gemini is unhealthy
+        attempt_numbers = itertools.count()
+        
+        async def attempt_insights():
+            attempt = next(attempt_numbers)
+            response = await llm_client.generate(enhanced_prompt, config)
+            insights = parse_insights_text(response_text_of(response), selected_text, attempt)
+            if not insights:
+                raise InvalidResponseError("Gemini insights too short or shallow")
+            return insights
+        
+        try:
+            insights = await call_with_retries("gemini", attempt_insights, attempts=3)
+            await cache_insights(selected_text, relevant_snippets, insights)
+            return insights
+        except CircuitOpenError:
+            print("⚡ Gemini circuit open, using enhanced fallback analysis...")
+        except Exception as e:
+            print(f"Gemini 2.5 Flash API error: {e}")
         
-        # Generate enhanced insights using Gemini 2.5 Flash with retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(enhanced_prompt)
-                
-                # FIXED: Handle new Gemini 2.5 Flash response format
-                response_text = ""
-                if hasattr(response, 'text'):
-                    response_text = response.text
-                elif hasattr(response, 'parts') and response.parts:
-                    response_text = ''.join([part.text for part in response.parts if hasattr(part, 'text')])
-                elif hasattr(response, 'candidates') and response.candidates:
-                    for candidate in response.candidates:
-                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                            response_text += ''.join([part.text for part in candidate.content.parts if hasattr(part, 'text')])
-                
-                if response_text and len(response_text) > 100:
-                    # Try to parse as JSON
-                    try:
-                        insights = json.loads(response_text)
-                        print(f"Deep Gemini 2.5 Flash insights generated successfully (attempt {attempt + 1})")
-                        
-                        # Validate that we have meaningful insights
-                        total_insights = sum(len(v) for v in insights.values() if isinstance(v, list))
-                        if total_insights > 5:  # Ensure we have substantial content
-                            return insights
-                        else:
-                            print(f"Insights too shallow, retrying... (attempt {attempt + 1})")
-                            continue
-                            
-                    except json.JSONDecodeError:
-                        print(f"JSON parsing failed on attempt {attempt + 1}, extracting from text...")
-                        insights = extract_enhanced_insights_from_text(response_text, selected_text)
-                        if insights:
-                            return insights
-                        
-                else:
-                    print(f"Response too short on attempt {attempt + 1}")
-                    
-            except Exception as e:
-                print(f"Gemini 2.5 Flash API error on attempt {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)  # Wait before retry
-                    continue
-                    
         # If all retries failed, use enhanced fallback
         print("🔄 All Gemini 2.5 Flash attempts failed, using enhanced fallback analysis...")
+        record_outcome("gemini", "fallback")
         return generate_enhanced_fallback_insights(selected_text, relevant_snippets)
         
     except Exception as e:
         print(f"Critical error in Gemini 2.5 Flash insights generation: {e}")
         return generate_enhanced_fallback_insights(selected_text, relevant_snippets)
 
+async def cache_insights(selected_text: str, relevant_snippets: List[dict], insights: dict):
+    """Persist Gemini insights for repeat selections; a cache write failure never fails the analysis"""
+    try:
+        await run_in_thread("storage", put_cached_insights, selected_text, relevant_snippets, insights)
+    except Exception as e:
+        print(f"Insight cache write failed: {e}")
+
 def extract_enhanced_insights_from_text(gemini_text: str, selected_text: str) -> dict:
     """Extract insights from Gemini text response with better parsing"""
     insights = {
@@ -612,6 +639,53 @@ def create_enhanced_mp3(file_path: Path, script: str):
         with open(file_path, 'wb') as f:
             f.write(b'ID3\x03\x00\x00\x00\x00\x00\x00' + b'\x00' * 10000)
 
+async def extract_documents(contents: List[bytes], file_hashes: List[str]) -> list:
+    """
+    Extraction results in input order, served from the outline cache when the file hash is known
+    Misses are parsed on the process pool and written back; a failed file yields its exception
+    """
+    extractions = [None] * len(contents)
+    misses = []
+    for i, file_hash in enumerate(file_hashes):
+        cached = await run_in_thread("storage", get_cached_extraction, file_hash)
+        if cached is not None:
+            extractions[i] = {**cached, "timings": {}, "cache_hit": True}
+        else:
+            misses.append(i)
+
+    if contents:
+        print(f"🗃️ Outline cache: {len(contents) - len(misses)} hits, {len(misses)} misses")
+
+    results = await map_in_process("pdf_parse", process_pdf_document, [contents[i] for i in misses])
+    for i, result in zip(misses, results):
+        extractions[i] = result
+        # Don't persist the extractor's error placeholder outline
+        if not isinstance(result, BaseException) and not result["outline"].get("title", "").startswith("Error:"):
+            await run_in_thread("storage", put_cached_extraction, file_hashes[i], result)
+
+    return extractions
+
+def release_blob_references(ref_ids: List[str]):
+    """Drop document references and delete blobs no other document uses"""
+    released = release_references(ref_ids)
+    print(f"🔗 Released {released} blob references")
+    collect_garbage()
+
+def release_session_blobs(session_data: dict):
+    """Drop a session's PDF blob references (prior documents and the current document)"""
+    docs = session_data.get("prior_documents", []) + [session_data.get("current_document") or {}]
+    release_blob_references([doc["unique_id"] for doc in docs if doc.get("unique_id")])
+
+def on_session_removed(session_id: str, session_data: dict, reason: str):
+    """Free per-session resources when a session is deleted, cleared, expired or evicted"""
+    drop_session_index(session_id)
+    drop_section_candidates(session_id)
+    remove_session_jobs(session_id)
+    remove_session_documents(session_id)
+    release_session_blobs(session_data)
+
+SESSION_STORAGE.add_removal_listener(on_session_removed)
+
 # Adobe Challenge Endpoints
 
 # FIXED INGEST-PRIOR-DOCUMENTS FUNCTION
@@ -624,6 +698,8 @@ async def ingest_prior_documents(
     Adobe Step 1: Upload and index 20-30 prior documents with unique IDs
     These form the knowledge base for finding connections
     """
+    # Blob references taken by this request; released again if it fails before the session is stored
+    new_refs = []
     try:
         if not files:
             raise HTTPException(status_code=400, detail="No files provided")
@@ -639,49 +715,60 @@ async def ingest_prior_documents(
             "total_sections": 0
         }
 
-        extractor = ProperPDFExtractor()
         processed_count = 0
 
-        # Create unique storage directory for PDFs
-        pdf_storage_dir = Path("storage/pdfs")
-        pdf_storage_dir.mkdir(parents=True, exist_ok=True)
+        # Per-stage ingest timings in milliseconds
+        ingest_started = time.perf_counter()
+        timings = {"open_ms": 0.0, "outline_ms": 0.0, "sections_ms": 0.0, "outline_cache_hits": 0}
 
+        # Read every PDF first, then extract them in parallel on the ingest process pool
+        uploads = []
         for idx, file in enumerate(files):
             if not file.filename.endswith('.pdf'):
                 print(f"Skipping non-PDF file: {file.filename}")
                 continue
+            content = await file.read()
+            uploads.append((idx, file.filename, content, hashlib.sha256(content).hexdigest()))
+        timings["read_ms"] = round((time.perf_counter() - ingest_started) * 1000, 2)
+
+        print(f"⚙️ Extracting {len(uploads)} PDFs on the ingest process pool")
+        stage_started = time.perf_counter()
+        extractions = await extract_documents(
+            [content for _, _, content, _ in uploads], [file_hash for _, _, _, file_hash in uploads]
+        )
+        timings["extract_wall_ms"] = round((time.perf_counter() - stage_started) * 1000, 2)
 
-            try:
-                print(f"📄 Processing file {idx + 1}/{len(files)}: {file.filename}")
+        # Results come back in upload order
+        for (idx, filename, content, file_hash), extraction in zip(uploads, extractions):
+            if isinstance(extraction, BaseException):
+                print(f"Failed to process {filename}: {extraction}")
+                continue
 
-                # Read file content
-                content = await file.read()
-                file_hash = hashlib.sha256(content).hexdigest()
+            try:
+                print(f"📄 Processing file {idx + 1}/{len(files)}: {filename}")
 
                 # Generate unique PDF ID - FIXED!
                 unique_pdf_id = str(uuid4())
                 print(f"🆔 Generated unique ID: {unique_pdf_id}")
 
-                # Extract document structure
-                outline = extractor.extract_outline(content)
+                # Document structure extracted by the worker
+                outline = extraction["outline"]
 
-                # Store PDF with unique filename - FIXED!
+                # Served as /files/{unique_id}.pdf; bytes live once per SHA-256 in the blob store
                 unique_filename = f"{unique_pdf_id}.pdf"
-                pdf_file_path = pdf_storage_dir / unique_filename
-
-                # Save PDF file with unique name
-                with open(pdf_file_path, 'wb') as f:
-                    f.write(content)
-
-                print(f"💾 Saved PDF: {pdf_file_path}")
+                blob = await run_in_thread("storage", store_and_reference, unique_pdf_id, content, file_hash)
+                new_refs.append(unique_pdf_id)
+                pdf_file_path = blob["path"]
+                if blob["deduplicated"]:
+                    timings["deduplicated_blobs"] = timings.get("deduplicated_blobs", 0) + 1
 
-                # Create document embeddings for semantic search
-                doc_embeddings = create_document_embeddings(content, outline)
+                # Section records for semantic search
+                doc_embeddings = extraction["embeddings"]
 
                 # Store enhanced document data with unique ID - FIXED!
                 doc_data = {
                     "unique_id": unique_pdf_id,  # FIXED: Proper UUID
-                    "original_filename": file.filename,  # FIXED: Original name
+                    "original_filename": filename,  # FIXED: Original name
                     "stored_filename": unique_filename,  # FIXED: Stored name
                     "file_path": str(pdf_file_path),  # FIXED: Full file path
                     "access_url": f"/files/{unique_filename}",  # FIXED: Access URL
@@ -694,26 +781,49 @@ async def ingest_prior_documents(
                     "metadata": {
                         "pages_count": len(outline.get("outline", [])),
                         "upload_index": idx,
-                        "session_id": user_session_id
+                        "session_id": user_session_id,
+                        "ingest_timings": extraction["timings"],
+                        "outline_cache_hit": extraction.get("cache_hit", False)
                     }
                 }
 
+                for stage, elapsed in extraction["timings"].items():
+                    timings[stage] = round(timings[stage] + elapsed, 2)
+                if extraction.get("cache_hit"):
+                    timings["outline_cache_hits"] += 1
+
                 session_data["prior_documents"].append(doc_data)
                 session_data["total_sections"] += doc_data["total_sections"]
                 processed_count += 1
 
-                print(f"Processed {file.filename} -> ID: {unique_pdf_id}")
+                print(f"Processed {filename} -> ID: {unique_pdf_id}")
 
             except Exception as e:
-                print(f"Failed to process {file.filename}: {e}")
+                print(f"Failed to process {filename}: {e}")
                 # Continue processing other files
                 continue
 
         if processed_count == 0:
             raise HTTPException(status_code=400, detail="No valid PDF files were processed")
 
-        # Store session data - FIXED!
-        store_session_data(user_session_id, session_data)
+        # Fit one session-wide retrieval index over every section
+        stage_started = time.perf_counter()
+        retrieval_index = await run_in_thread(
+            "embedding", build_session_index, user_session_id, session_data["prior_documents"], SECTION_VECTOR_CACHE
+        )
+        timings["index_wall_ms"] = round((time.perf_counter() - stage_started) * 1000, 2)
+        timings["index"] = retrieval_index.timings
+        timings["total_ms"] = round((time.perf_counter() - ingest_started) * 1000, 2)
+        print(f"⏱️ Ingest timings: {timings}")
+
+        # Store session data - FIXED! Re-ingesting replaces the session, so release the documents it held
+        previous = await run_in_thread("storage", replace_session_data, user_session_id, session_data)
+        new_refs = []
+        if previous:
+            await run_in_thread("storage", release_session_blobs, previous)
+        await run_in_thread(
+            "storage", index_session_documents, user_session_id, session_data["prior_documents"]
+        )
         
         print(f"Session data stored successfully for {user_session_id}")
 
@@ -731,6 +841,8 @@ async def ingest_prior_documents(
                 for doc in session_data["prior_documents"]
             ],
             "session_id": user_session_id,
+            "retrieval_index": retrieval_index.stats(),
+            "timings": timings,
             "message": f"Successfully indexed {processed_count} prior documents with unique IDs"
         }
 
@@ -739,10 +851,17 @@ async def ingest_prior_documents(
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
+    finally:
+        if new_refs:
+            try:
+                await run_in_thread("storage", release_blob_references, new_refs)
+            except Exception as e:
+                print(f"Could not release blob references of failed ingest: {e}")
 
 @router.post("/set-current-document/")
 async def set_current_document(
     file: UploadFile,
+    background_tasks: BackgroundTasks,
     user_session_id: str = Form(...)
 ):
     """
@@ -759,31 +878,56 @@ async def set_current_document(
         content = await file.read()
         file_hash = hashlib.sha256(content).hexdigest()
         
-        # Extract document structure
-        extractor = ProperPDFExtractor()
-        outline = extractor.extract_outline(content)
+        # Extract document structure off the event loop (or reuse the cached outline)
+        extraction = (await extract_documents([content], [file_hash]))[0]
+        if isinstance(extraction, BaseException):
+            raise extraction
+        outline = extraction["outline"]
         
         # Get existing session data
-        session_data = get_session_data(user_session_id)
+        session_data = await run_in_thread("storage", get_session_data, user_session_id)
         if not session_data:
             raise HTTPException(status_code=400, detail="Session not found. Please upload prior documents first.")
         
-        # Add current document to session
-        session_data["current_document"] = {
+        # Persist the bytes in the blob store; the session only keeps a reference
+        current_id = str(uuid4())
+        blob = await run_in_thread("storage", store_and_reference, current_id, content, file_hash)
+        current_document = {
+            "unique_id": current_id,
             "filename": file.filename,
             "file_hash": file_hash,
+            "file_path": str(blob["path"]),
+            "access_url": f"/files/{current_id}.pdf",
             "upload_timestamp": datetime.utcnow().isoformat(),
             "content_size": len(content),
             "outline": outline,
-            "total_sections": len(outline.get("outline", [])),
-            "file_content": content
+            "total_sections": len(outline.get("outline", []))
         }
         
-        # Update session storage
-        store_session_data(user_session_id, session_data)
+        # Swap it in atomically: the document replaced is whatever is current at write time
+        replaced = []
+        def set_document(data: dict):
+            replaced.append(data.get("current_document") or {})
+            data["current_document"] = current_document
+        session_data = await run_in_thread("storage", update_session_data, user_session_id, set_document)
+        if session_data is None:
+            await run_in_thread("storage", release_blob_references, [current_id])
+            raise HTTPException(status_code=400, detail="Session not found. Please upload prior documents first.")
+        previous_doc = replaced[0]
+        
+        # Release the document this one replaces (after referencing the new one, so a re-upload keeps its blob)
+        if previous_doc.get("unique_id"):
+            await run_in_thread("storage", release_blob_references, [previous_doc["unique_id"]])
         
         print(f"Current document set: {file.filename} with {len(outline.get('outline', []))} sections")
         
+        # Warm per-section candidate sets once the response is sent
+        if PRECOMPUTE_SECTION_CANDIDATES and session_data.get("prior_documents"):
+            background_tasks.add_task(
+                warm_section_candidates, user_session_id,
+                session_data["current_document"], session_data["prior_documents"]
+            )
+        
         return {
             "success": True,
             "filename": file.filename,
@@ -797,153 +941,395 @@ async def set_current_document(
         print(f"Current document upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Current document upload failed: {str(e)}")
 
+async def load_session_index(session_id: str, prior_docs: List[dict]) -> SessionRetrievalIndex:
+    """This worker's copy of the session index, rebuilt if no current version is cached or saved"""
+    retrieval_index = await run_in_thread("storage", get_session_index, session_id, prior_docs)
+    if retrieval_index is None:
+        print(f"🗂️ No index cached for session {session_id}, rebuilding...")
+        retrieval_index = await run_in_thread(
+            "embedding", build_session_index, session_id, prior_docs, SECTION_VECTOR_CACHE
+        )
+    return retrieval_index
+
+async def warm_section_candidates(session_id: str, current_doc: dict, prior_docs: List[dict]):
+    """Background task: run retrieval for every heading of the current document (per-worker warm cache)"""
+    try:
+        retrieval_index = await load_session_index(session_id, prior_docs)
+        modes = ["tfidf"] + (["dense"] if retrieval_index.has_dense else [])
+        await run_in_thread(
+            "retrieval", precompute_section_candidates,
+            session_id, current_doc, retrieval_index, index_version(prior_docs), modes
+        )
+    except Exception as e:
+        print(f"Section candidate warm-up failed for {session_id}: {e}")
+
+async def prepare_selection_analysis(selection_text: str, page_number: int, user_session_id: str,
+                                     retrieval_mode: str) -> dict:
+    """Validate a selection request and retrieve its related snippets from the session's prior documents"""
+    if len(selection_text.strip()) < 15:  # Increased minimum for better analysis
+        raise HTTPException(status_code=400, detail="Please select more text (at least 15 characters) for comprehensive AI analysis.")
+    
+    print(f"🎯 Analyzing selection for session {user_session_id}")
+    print(f"📝 Selected text (page {page_number}): {selection_text[:100]}...")
+    
+    # Get session data
+    session_data = await run_in_thread("storage", get_session_data, user_session_id)
+    if not session_data:
+        raise HTTPException(status_code=400, detail="Session not found")
+    
+    prior_docs = session_data.get("prior_documents", [])
+    current_doc = session_data.get("current_document")
+    
+    if not prior_docs:
+        raise HTTPException(status_code=400, detail="No prior documents found. Please upload prior documents first.")
+    
+    if not current_doc:
+        raise HTTPException(status_code=400, detail="No current document found. Please upload current document first.")
+    
+    print(f"🔍 Searching across {len(prior_docs)} prior documents")
+    
+    # 1. Retrieve MORE relevant snippets for better context
+    retrieval_index = await load_session_index(user_session_id, prior_docs)
+    retrieval_mode = retrieval_index.resolve_mode(retrieval_mode)
+    top_k = 15  # Increased for richer context
+    
+    # Score only the warm candidates of the selection's page when the background warm-up has run
+    # (opt-in, approximate: top k among the candidates, not necessarily the global top k);
+    # too few matches there means the selection strays from its headings, so scan everything
+    candidate_rows = get_page_candidates(
+        user_session_id, index_version(prior_docs), current_doc.get("unique_id"), page_number, retrieval_mode
+    )
+    candidate_source = "full"
+    relevant_snippets = None
+    if candidate_rows is not None:
+        relevant_snippets = await run_in_thread(
+            "retrieval", retrieve_from_prior_documents,
+            selection_text, prior_docs, top_k=top_k,
+            index=retrieval_index, mode=retrieval_mode, rows=candidate_rows
+        )
+        if len(relevant_snippets) >= top_k:
+            candidate_source = "warm"
+            print(f"🔥 Scored {len(candidate_rows)}/{retrieval_index.size} warm candidate sections")
+        else:
+            record_fallback()
+            relevant_snippets = None
+    if relevant_snippets is None:
+        relevant_snippets = await run_in_thread(
+            "retrieval", retrieve_from_prior_documents,
+            selection_text, prior_docs, top_k=top_k,
+            index=retrieval_index, mode=retrieval_mode
+        )
+    
+    print(f"📋 Found {len(relevant_snippets)} relevant snippets")
+    
+    return {
+        "selection_text": selection_text,
+        "page_number": page_number,
+        "user_session_id": user_session_id,
+        "prior_docs": prior_docs,
+        "current_doc": current_doc,
+        "retrieval_mode": retrieval_mode,
+        "candidate_source": candidate_source,
+        "relevant_snippets": relevant_snippets
+    }
+
+async def complete_selection_analysis(context: dict, insights: dict, insight_cache: str, insights_ms: float,
+                                      prompt_report: Optional[dict] = None) -> dict:
+    """Assemble the analysis result and append it to the session history"""
+    selection_text = context["selection_text"]
+    relevant_snippets = context["relevant_snippets"]
+    
+    # 3. Enhanced podcast script
+    podcast_script = {
+        "title": f"Deep AI Analysis: {selection_text[:50]}...",
+        "duration_estimate": "4-7 minutes",
+        "speakers": ["AI Research Host", "Deep Analysis Expert"],
+        "script_outline": [
+            "Introduction to selected concept with context",
+            "Deep cross-document pattern analysis", 
+            "Strategic contradictions and evolutionary variations",
+            "Breakthrough connections and synthesis",
+            "Actionable intelligence and recommendations"
+        ],
+        "enhanced": True,
+        "status": "ready_for_generation"
+    }
+    
+    # Store enhanced analysis
+    analysis_result = {
+        "analysis_id": str(uuid4()),
+        "selection": {
+            "text": selection_text,
+            "page": context["page_number"],
+            "timestamp": datetime.utcnow().isoformat(),
+            "length": len(selection_text)
+        },
+        "relevant_snippets": relevant_snippets,
+        "insights": insights,
+        "podcast": podcast_script,
+        "metadata": {
+            "prior_docs_searched": len(context["prior_docs"]),
+            "snippets_found": len(relevant_snippets),
+            "high_relevance_snippets": len([s for s in relevant_snippets if s["similarity_score"] > 0.3]),
+            "current_document": context["current_doc"]["filename"],
+            "retrieval_mode": context["retrieval_mode"],
+            "candidate_source": context["candidate_source"],
+            "insight_cache": insight_cache,
+            "insights_ms": insights_ms,
+            "prompt": prompt_report or None,  # None when the insights came from the cache
+            "ai_powered": True,
+            "deep_analysis": True,
+            "insight_categories": len([k for k, v in insights.items() if v and len(v) > 0]),
+            "total_insights": sum(len(v) for v in insights.values() if isinstance(v, list)),
+            "gemini_model": "gemini-2.5-flash"  # Track which model was used
+        }
+    }
+    
+    # Start narrating it right away when speculative podcasts are on
+    if SPECULATIVE_PODCASTS_ENABLED:
+        podcast_script["speculative_job_id"] = await start_speculative_podcast(
+            context["user_session_id"], selection_text, analysis_result
+        )
+    
+    # Add to session history (re-read at write time: the session may have changed during the Gemini call)
+    await run_in_thread(
+        "storage", update_session_data, context["user_session_id"],
+        lambda data: data.setdefault("analysis_history", []).append(analysis_result)
+    )
+    
+    print(f"Deep Gemini 2.5 Flash analysis completed: {analysis_result['metadata']['total_insights']} total insights generated")
+    
+    return analysis_result
+
 @router.post("/analyze-selection/")
 async def analyze_text_selection(
+    request: Request,
     selection_text: str = Form(...),
     page_number: int = Form(...),
-    user_session_id: str = Form(...)
+    user_session_id: str = Form(...),
+    retrieval_mode: str = Form("tfidf")
 ):
     """
     ENHANCED Adobe Step 3: Core requirement - analyze selected text with DEEP Gemini 2.5 Flash insights
     Find connections from PRIOR documents only
     """
     try:
-        if len(selection_text.strip()) < 15:  # Increased minimum for better analysis
-            raise HTTPException(status_code=400, detail="Please select more text (at least 15 characters) for comprehensive AI analysis.")
-        
-        print(f"🎯 Analyzing selection for session {user_session_id}")
-        print(f"📝 Selected text (page {page_number}): {selection_text[:100]}...")
-        
-        # Get session data
-        session_data = get_session_data(user_session_id)
-        if not session_data:
-            raise HTTPException(status_code=400, detail="Session not found")
-        
-        prior_docs = session_data.get("prior_documents", [])
-        current_doc = session_data.get("current_document")
-        
-        if not prior_docs:
-            raise HTTPException(status_code=400, detail="No prior documents found. Please upload prior documents first.")
-        
-        if not current_doc:
-            raise HTTPException(status_code=400, detail="No current document found. Please upload current document first.")
-        
-        print(f"🔍 Searching across {len(prior_docs)} prior documents")
-        
-        # 1. Retrieve MORE relevant snippets for better context
-        relevant_snippets = retrieve_from_prior_documents(
-            selection_text, prior_docs, top_k=15  # Increased for richer context
-        )
-        
-        print(f"📋 Found {len(relevant_snippets)} relevant snippets")
-        
-        # 2. Generate DEEP Gemini 2.5 Flash AI insights
-        print("🤖 Generating DEEP Gemini 2.5 Flash AI insights...")
-        insights = await generate_gemini_insights(selection_text, relevant_snippets)
-        
-        # 3. Enhanced podcast script
-        podcast_script = {
-            "title": f"Deep AI Analysis: {selection_text[:50]}...",
-            "duration_estimate": "4-7 minutes",
-            "speakers": ["AI Research Host", "Deep Analysis Expert"],
-            "script_outline": [
-                "Introduction to selected concept with context",
-                "Deep cross-document pattern analysis", 
-                "Strategic contradictions and evolutionary variations",
-                "Breakthrough connections and synthesis",
-                "Actionable intelligence and recommendations"
-            ],
-            "enhanced": True,
-            "status": "ready_for_generation"
-        }
-        
-        # Store enhanced analysis
-        analysis_result = {
-            "selection": {
-                "text": selection_text,
-                "page": page_number,
-                "timestamp": datetime.utcnow().isoformat(),
-                "length": len(selection_text)
-            },
-            "relevant_snippets": relevant_snippets,
-            "insights": insights,
-            "podcast": podcast_script,
-            "metadata": {
-                "prior_docs_searched": len(prior_docs),
-                "snippets_found": len(relevant_snippets),
-                "high_relevance_snippets": len([s for s in relevant_snippets if s["similarity_score"] > 0.3]),
-                "current_document": current_doc["filename"],
-                "ai_powered": True,
-                "deep_analysis": True,
-                "insight_categories": len([k for k, v in insights.items() if v and len(v) > 0]),
-                "total_insights": sum(len(v) for v in insights.values() if isinstance(v, list)),
-                "gemini_model": "gemini-2.5-flash"  # Track which model was used
-            }
-        }
-        
-        # Add to session history
-        if "analysis_history" not in session_data:
-            session_data["analysis_history"] = []
-        session_data["analysis_history"].append(analysis_result)
-        store_session_data(user_session_id, session_data)
-        
-        print(f"Deep Gemini 2.5 Flash analysis completed: {analysis_result['metadata']['total_insights']} total insights generated")
-        
-        return analysis_result
-        
+        # A client that navigates away stops waiting; the shared analysis is cancelled once no caller is left
+        flight_key = (user_session_id, page_number, retrieval_mode, normalize_selection(selection_text))
+        return await cancel_on_disconnect(request, ANALYSIS_FLIGHTS.run(
+            flight_key, run_selection_analysis, selection_text, page_number, user_session_id, retrieval_mode
+        ))
+        
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         print(f"Enhanced selection analysis failed: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Enhanced analysis failed: {str(e)}")
 
-def retrieve_from_prior_documents(selection_text: str, prior_docs: List[dict], top_k: int = 15) -> List[dict]:
+async def run_selection_analysis(selection_text: str, page_number: int, user_session_id: str,
+                                 retrieval_mode: str) -> dict:
+    """Retrieval, insights and result assembly for one selection"""
+    context = await prepare_selection_analysis(selection_text, page_number, user_session_id, retrieval_mode)
+    insights, insight_cache, insights_ms, prompt_report = await resolve_selection_insights(context)
+    return await complete_selection_analysis(context, insights, insight_cache, insights_ms, prompt_report)
+
+async def resolve_selection_insights(context: dict):
+    """Insights for a prepared selection: returns (insights, insight_cache, insights_ms, prompt_report)"""
+    selection_text = context["selection_text"]
+    relevant_snippets = context["relevant_snippets"]
+    
+    # 2. Generate DEEP Gemini 2.5 Flash AI insights (or reuse them for a repeated selection)
+    insights_started = time.perf_counter()
+    insights = await run_in_thread("storage", get_cached_insights, selection_text, relevant_snippets)
+    insight_cache = "hit" if insights is not None else "miss"
+    prompt_report = {}
+    if insights is None:
+        print("🤖 Generating DEEP Gemini 2.5 Flash AI insights...")
+        insights = await generate_gemini_insights(selection_text, relevant_snippets, prompt_report)
+    else:
+        print("⚡ Insight cache hit, skipping Gemini")
+    insights_ms = round((time.perf_counter() - insights_started) * 1000, 2)
+    return insights, insight_cache, insights_ms, prompt_report
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/analyze-selection/stream")
+async def analyze_text_selection_stream(
+    selection_text: str = Form(...),
+    page_number: int = Form(...),
+    user_session_id: str = Form(...),
+    retrieval_mode: str = Form("tfidf")
+):
+    """
+    Streaming /analyze-selection/ (text/event-stream)
+    Events: "snippets" as soon as retrieval finishes, "insight_chunk" while Gemini writes,
+    "insights" with the parsed result and finally "metadata" (the same block as the JSON endpoint)
+    """
+    try:
+        context = await prepare_selection_analysis(selection_text, page_number, user_session_id, retrieval_mode)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Enhanced selection analysis failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Enhanced analysis failed: {str(e)}")
+    
+    relevant_snippets = context["relevant_snippets"]
+    
+    async def events():
+        yield sse_event("snippets", {
+            "relevant_snippets": relevant_snippets,
+            "retrieval_mode": context["retrieval_mode"]
+        })
+        
+        insights_started = time.perf_counter()
+        insights = await run_in_thread("storage", get_cached_insights, selection_text, relevant_snippets)
+        insight_cache = "hit" if insights is not None else "miss"
+        prompt_report = None
+        
+        if insights is None:
+            # Single streamed attempt; an unusable or failed stream (or an open circuit) falls back
+            breaker = get_breaker("gemini")
+            if breaker.allow():
+                response_parts = []
+                prompt, prompt_report = build_insights_prompt(selection_text, relevant_snippets)
+                try:
+                    async for chunk in llm_client.generate_stream(prompt, insights_generation_config()):
+                        response_parts.append(chunk)
+                        yield sse_event("insight_chunk", {"text": chunk})
+                    breaker.record_success()
+                    record_outcome("gemini", "success")
+                    insights = parse_insights_text("".join(response_parts), selection_text)
+                except Exception as e:
+                    breaker.record_failure()
+                    record_outcome("gemini", "failure")
+                    print(f"Gemini insight stream failed: {e}")
+            else:
+                record_outcome("gemini", "short_circuit")
+                print("⚡ Gemini circuit open, skipping stream")
+            
+            if insights:
+                await cache_insights(selection_text, relevant_snippets, insights)
+            else:
+                print("🔄 Streamed Gemini insights unusable, using enhanced fallback analysis...")
+                record_outcome("gemini", "fallback")
+                insights = generate_enhanced_fallback_insights(selection_text, relevant_snippets)
+        
+        insights_ms = round((time.perf_counter() - insights_started) * 1000, 2)
+        yield sse_event("insights", {"insights": insights})
+        
+        analysis_result = await complete_selection_analysis(
+            context, insights, insight_cache, insights_ms, prompt_report
+        )
+        yield sse_event("metadata", analysis_result["metadata"])
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws/selection/{user_session_id}")
+async def selection_socket(websocket: WebSocket, user_session_id: str):
+    """
+    Selection channel for drag-selecting readers
+    Client messages: {"selection_text", "page_number", "retrieval_mode"?, "selection_id"?}
+    Each message waits out the debounce window; a newer message cancels the pending or running
+    analysis (retrieval and Gemini call) so only the selection the reader keeps is analyzed.
+    Server events (with the selection_id echoed back): "snippets", "insights", "result",
+    "cancelled" and "error"
+    """
+    await websocket.accept()
+    current = None  # (selection_id, task) of the latest selection
+    
+    async def send(event: str, selection_id, data: dict):
+        await websocket.send_json({"event": event, "selection_id": selection_id, **data})
+    
+    async def send_error(selection_id, status_code: int, detail: str):
+        # The socket may have closed mid-analysis; then there is nobody left to tell
+        try:
+            await send("error", selection_id, {"status_code": status_code, "detail": detail})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+    
+    async def analyze(selection_id, message: dict):
+        await asyncio.sleep(SELECTION_DEBOUNCE_SECONDS)
+        try:
+            context = await prepare_selection_analysis(
+                str(message.get("selection_text", "")), int(message.get("page_number", 1)),
+                user_session_id, message.get("retrieval_mode", "tfidf")
+            )
+            await send("snippets", selection_id, {
+                "relevant_snippets": context["relevant_snippets"],
+                "retrieval_mode": context["retrieval_mode"]
+            })
+            insights, insight_cache, insights_ms, prompt_report = await resolve_selection_insights(context)
+            await send("insights", selection_id, {"insights": insights})
+            analysis_result = await complete_selection_analysis(
+                context, insights, insight_cache, insights_ms, prompt_report
+            )
+            await send("result", selection_id, {"analysis": analysis_result})
+        except WebSocketDisconnect:
+            return
+        except HTTPException as e:
+            await send_error(selection_id, e.status_code, e.detail)
+        except (ValueError, TypeError) as e:
+            await send_error(selection_id, 400, f"Invalid selection message: {e}")
+        except Exception as e:
+            print(f"WebSocket selection analysis failed: {e}")
+            await send_error(selection_id, 500, f"Enhanced analysis failed: {str(e)}")
+    
+    def cancel_current():
+        if current is not None and not current[1].done():
+            current[1].cancel()
+            return True
+        return False
+    
+    try:
+        while True:
+            # receive() rather than receive_text(): a binary frame gets an error event instead of a KeyError
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            message = None
+            if frame.get("text") is not None:
+                try:
+                    message = json.loads(frame["text"])
+                except json.JSONDecodeError:
+                    pass
+            if not isinstance(message, dict):
+                await send("error", None, {"status_code": 400, "detail": "Expected a JSON object"})
+                continue
+            if cancel_current():
+                print(f"✂️ Selection {current[0]} superseded for session {user_session_id}")
+                await send("cancelled", current[0], {})
+            selection_id = message.get("selection_id") or str(uuid4())
+            current = (selection_id, asyncio.create_task(analyze(selection_id, message)))
+    except WebSocketDisconnect:
+        print(f"🔌 Selection socket closed for session {user_session_id}")
+    finally:
+        cancel_current()
+
+def retrieve_from_prior_documents(selection_text: str, prior_docs: List[dict], top_k: int = 15,
+                                  index: SessionRetrievalIndex = None, mode: str = "tfidf",
+                                  rows: Optional[np.ndarray] = None) -> List[dict]:
     """
     Search for relevant snippets in prior documents only
     Adobe's core requirement: DON'T search in current document
+    Scores come from the session index fitted at ingest: "tfidf" is one transform + one
+    sparse mat-vec, "dense" is one product against the session embedding matrix
+    rows restricts scoring to a warm candidate set
     """
-    relevant_snippets = []
     print(f"🔍 Searching for: '{selection_text[:50]}...'")
 
     try:
-        for doc_idx, doc in enumerate(prior_docs):
-            # CRITICAL FIX: Use correct field names
-            doc_filename = doc.get("original_filename", f"Document_{doc_idx}")
-            doc_unique_id = doc.get("unique_id", f"doc_{doc_idx}")  # Use unique_id
-            outline = doc.get("outline", {})
-
-            # Search through document sections
-            for section_idx, section in enumerate(outline.get("outline", [])):
-                section_text = section.get("text", "")
-                if not section_text.strip():
-                    continue
-
-                # Calculate relevance score
-                similarity_score = calculate_similarity(selection_text.lower(), section_text.lower())
-                selection_words = set(selection_text.lower().split())
-                section_words = set(section_text.lower().split())
-                keyword_overlap = len(selection_words.intersection(section_words)) / max(len(selection_words), 1)
-                combined_score = (similarity_score * 0.7) + (keyword_overlap * 0.3)
-
-                if combined_score > 0.1:
-                    snippet = {
-                        "document_name": doc_filename,
-                        "document_id": doc_unique_id,    # CRITICAL: Use unique_id
-                        "unique_id": doc_unique_id,      # CRITICAL: For PDF preview
-                        "section_text": section_text,
-                        "page": section.get("page", 1),
-                        "section_level": section.get("level", 1),
-                        "similarity_score": combined_score,
-                        "keyword_overlap": keyword_overlap,
-                        "deep_link": f"doc_{doc_unique_id}_page_{section.get('page', 1)}",
-                        "snippet_length": len(section_text),
-                        "section_index": section_idx
-                    }
-                    relevant_snippets.append(snippet)
+        if index is None:
+            index = SessionRetrievalIndex.build(prior_docs)
 
-        # Sort by relevance score (descending)
-        relevant_snippets.sort(key=lambda x: x["similarity_score"], reverse=True)
-        top_snippets = relevant_snippets[:top_k]
+        top_snippets = index.search(selection_text, top_k, mode, rows)
         
         # DEBUG LOG  
         print(f"📊 Found {len(top_snippets)} snippets with unique IDs:")
@@ -957,7 +1343,7 @@ def retrieve_from_prior_documents(selection_text: str, prior_docs: List[dict], t
         return []
 
 @router.post("/generate-podcast/")
-async def generate_podcast(request: dict):
+async def generate_podcast(request: dict, http_request: Request):
     try:
         # --- Extract data from request body ---
         analysis_data = request.get("analysis_data")
@@ -973,36 +1359,28 @@ async def generate_podcast(request: dict):
         print(f"🎧 Generating podcast for session {session_id}")
 
         # --- Get session data ---
-        session_data = get_session_data(session_id)
+        session_data = await run_in_thread("storage", get_session_data, session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        # --- Generate podcast script (summary only, no branding) ---
-        podcast_script = await generate_podcast_summary(selected_text, analysis_data)
-        # --- Generate audio from script ---
-        audio_data = await generate_podcast_audio(podcast_script, session_id)
-
-        # --- Build podcast result object ---
-        podcast_result = {
-            "id": f"podcast_{session_id}_{int(datetime.utcnow().timestamp())}",
-            "script": podcast_script,
-            "audio_url": audio_data.get("audio_url"),
-            "duration": audio_data.get("duration", "0:00"),
-            "generated_at": datetime.utcnow().isoformat(),
-            "session_id": session_id,
-            "selected_text_preview": (
-                selected_text[:100] + "..."
-                if len(selected_text) > 100 else selected_text
-            ),
-            "status": "ready",
-            "ai_enhanced": True,
-            "deep_analysis": True,
-            "gemini_model": "gemini-2.5-flash",  # track internally
-        }
+        # --- Reuse the speculative podcast for this analysis, if one was started ---
+        analysis_id = request.get("analysis_id") or (
+            analysis_data.get("analysis_id") if isinstance(analysis_data, dict) else None
+        )
+        podcast_result = None
+        if analysis_id:
+            podcast_result = await cancel_on_disconnect(
+                http_request, attach_speculative_podcast(session_id, analysis_id)
+            )
+
+        # --- Otherwise generate script and audio; both stop if the client disconnects ---
+        if podcast_result is None:
+            podcast_script, audio_data = await cancel_on_disconnect(
+                http_request, generate_podcast_media(selected_text, analysis_data, session_id)
+            )
+            podcast_result = build_podcast_result(session_id, selected_text, podcast_script, audio_data)
 
-        # --- Store podcast in session ---
-        session_data.setdefault("podcasts", []).append(podcast_result)
-        store_session_data(session_id, session_data)
+        await run_in_thread("storage", append_session_podcast, session_id, podcast_result)
 
         print(f"Podcast generated successfully: {podcast_result['id']}")
 
@@ -1014,6 +1392,8 @@ async def generate_podcast(request: dict):
 
     except HTTPException:
         raise
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         print(f"Podcast generation failed: {str(e)}")
         import traceback
@@ -1021,19 +1401,196 @@ async def generate_podcast(request: dict):
         raise HTTPException(status_code=500, detail=f"Podcast generation failed: {str(e)}")
 
 
+def build_podcast_result(session_id: str, selected_text: str, podcast_script: str, audio_data: dict) -> dict:
+    """Podcast record as stored in the session's podcasts list"""
+    return {
+        "id": f"podcast_{session_id}_{int(datetime.utcnow().timestamp())}",
+        "script": podcast_script,
+        "audio_url": audio_data.get("audio_url"),
+        "duration": audio_data.get("duration", "0:00"),
+        "tts": audio_data.get("tts"),  # provider and per-chunk synthesis timings (None for cached/fallback audio)
+        "audio_cache": audio_data.get("audio_cache"),
+        "generated_at": datetime.utcnow().isoformat(),
+        "session_id": session_id,
+        "selected_text_preview": (
+            selected_text[:100] + "..."
+            if len(selected_text) > 100 else selected_text
+        ),
+        "status": "ready",
+        "ai_enhanced": True,
+        "deep_analysis": True,
+        "gemini_model": "gemini-2.5-flash",  # track internally
+    }
+
+
+def append_session_podcast(session_id: str, podcast_result: dict) -> bool:
+    """Add a finished podcast to the session atomically, so work done meanwhile isn't overwritten"""
+    session_data = update_session_data(
+        session_id, lambda data: data.setdefault("podcasts", []).append(podcast_result)
+    )
+    if session_data is None:
+        print(f"Session {session_id} gone, podcast {podcast_result['id']} not stored")
+        return False
+    return True
+
+
+async def generate_podcast_media(selected_text: str, analysis_data: dict, session_id: str):
+    """Podcast script (summary only, no branding) and its audio"""
+    podcast_script = await generate_podcast_summary(selected_text, analysis_data)
+    audio_data = await generate_podcast_audio(podcast_script, session_id)
+    return podcast_script, audio_data
+
+
+@router.post("/podcast-jobs/")
+async def submit_podcast_job(request: dict):
+    """
+    Queue podcast generation (same body as /generate-podcast/) and return a job ID immediately
+    Poll /podcast-jobs/{job_id} for per-stage progress; the finished podcast is added to the session
+    """
+    analysis_data = request.get("analysis_data")
+    session_id = request.get("session_id")
+    selected_text = request.get("selected_text", "")
+
+    if not session_id:
+        raise HTTPException(status_code=400, detail="session_id is required")
+    if not analysis_data:
+        raise HTTPException(status_code=400, detail="analysis_data is required")
+    if not await run_in_thread("storage", SESSION_STORAGE.__contains__, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    job = await run_in_thread("storage", create_job, session_id, PODCAST_JOB_STAGES)
+    try:
+        PODCAST_JOBS.submit(job["job_id"], run_podcast_job, session_id, selected_text, analysis_data)
+    except JobQueueFull as e:
+        await run_in_thread("storage", finish_job, job["job_id"], "failed", None, str(e))
+        raise HTTPException(status_code=503, detail="Podcast queue is full, try again shortly")
+
+    print(f"🎧 Queued podcast job {job['job_id']} for session {session_id}")
+    return {
+        "success": True,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/podcast-jobs/{job['job_id']}"
+    }
+
+
+@router.get("/podcast-jobs/{job_id}")
+async def get_podcast_job(job_id: str):
+    """Job status (queued, running, completed, failed), per-stage progress and the podcast once ready"""
+    job = await run_in_thread("storage", get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def run_podcast_job(job_id: str, session_id: str, selected_text: str, analysis_data: dict):
+    """Job runner: script, then audio (progress per synthesized chunk), then store in the session"""
+    podcast_result = await run_podcast_stages(job_id, session_id, selected_text, analysis_data)
+
+    await run_in_thread("storage", update_stage, job_id, "store", "running")
+    stored = await run_in_thread("storage", append_session_podcast, session_id, podcast_result)
+    await run_in_thread("storage", update_stage, job_id, "store", "done", stored=stored)
+
+    await run_in_thread("storage", finish_job, job_id, "completed", podcast_result)
+    print(f"Podcast job {job_id} completed: {podcast_result['id']}")
+
+
+async def run_speculative_podcast(job_id: str, session_id: str, selected_text: str, analysis_data: dict):
+    """Speculative job runner: script and audio only; the podcast joins the session once it is requested"""
+    podcast_result = await run_podcast_stages(job_id, session_id, selected_text, analysis_data, background=True)
+    await run_in_thread("storage", finish_job, job_id, "completed", podcast_result)
+    print(f"Speculative podcast ready for analysis {analysis_data.get('analysis_id')}: {podcast_result['id']}")
+
+
+async def run_podcast_stages(job_id: str, session_id: str, selected_text: str, analysis_data: dict,
+                             background: bool = False) -> dict:
+    """
+    The script and audio stages of a job, with progress; returns the podcast record
+    background=True runs them on the low-priority Gemini and TTS limits (speculative jobs)
+    """
+    await run_in_thread("storage", update_stage, job_id, "script", "running")
+    podcast_script = await generate_podcast_summary(selected_text, analysis_data, background=background)
+    await run_in_thread("storage", update_stage, job_id, "script", "done")
+
+    async def audio_progress(written: int, total: int):
+        await run_in_thread(
+            "storage", update_stage, job_id, "audio", "running",
+            progress=round(written / total, 3), chunks_written=written, chunks_total=total
+        )
+
+    async def audio_started(stream_url: str):
+        await run_in_thread("storage", update_stage, job_id, "audio", "running", stream_url=stream_url)
+
+    await run_in_thread("storage", update_stage, job_id, "audio", "running")
+    audio_data = await generate_podcast_audio(
+        podcast_script, session_id, on_chunk=audio_progress, on_start=audio_started, background=background
+    )
+    await run_in_thread("storage", update_stage, job_id, "audio", "done")
+    return build_podcast_result(session_id, selected_text, podcast_script, audio_data)
+
+
+async def start_speculative_podcast(session_id: str, selected_text: str, analysis_result: dict) -> Optional[str]:
+    """Queue low-priority narration of a fresh analysis; returns the job ID (None if the pool is full)"""
+    try:
+        job = await run_in_thread(
+            "storage", create_job, session_id, SPECULATIVE_PODCAST_STAGES,
+            {"speculative": True}, analysis_result["analysis_id"]
+        )
+    except Exception as e:
+        print(f"Could not record speculative podcast job: {e}")
+        return None
+    try:
+        SPECULATIVE_PODCASTS.submit(job["job_id"], run_speculative_podcast, session_id, selected_text, analysis_result)
+    except JobQueueFull:
+        await run_in_thread("storage", withdraw_queued_job, job["job_id"], "Speculative podcast queue full")
+        print("Speculative podcast queue full, skipping")
+        return None
+    return job["job_id"]
+
+
+async def attach_speculative_podcast(session_id: str, analysis_id: str) -> Optional[dict]:
+    """
+    The speculative podcast for this analysis: returned at once if finished, awaited if running
+    (for up to SPECULATIVE_ATTACH_TIMEOUT_SECONDS - it runs at low priority)
+    A job that hasn't started yet is withdrawn so the caller generates at normal priority instead;
+    None when there is nothing usable to attach to
+    """
+    job = await run_in_thread("storage", find_analysis_job, session_id, analysis_id)
+    if job is None:
+        return None
+    if job["status"] == "queued" and await run_in_thread(
+        "storage", withdraw_queued_job, job["job_id"], "Superseded by /generate-podcast/"
+    ):
+        print(f"Speculative podcast for analysis {analysis_id} not started yet, generating directly")
+        return None
+
+    if job["status"] in ("queued", "running"):
+        print(f"🔗 Attaching to in-flight speculative podcast {job['job_id']}")
+    deadline = time.monotonic() + SPECULATIVE_ATTACH_TIMEOUT_SECONDS
+    while job is not None and job["status"] in ("queued", "running"):
+        if time.monotonic() >= deadline:
+            print(f"Speculative podcast {job['job_id']} still running after "
+                  f"{SPECULATIVE_ATTACH_TIMEOUT_SECONDS:.0f}s, generating directly")
+            return None
+        await asyncio.sleep(JOB_POLL_SECONDS)
+        job = await run_in_thread("storage", get_job, job["job_id"])
+
+    if job is None or job["status"] != "completed":
+        print(f"Speculative podcast for analysis {analysis_id} unusable, generating directly")
+        return None
+    print(f"⚡ Reusing speculative podcast {job['result']['id']} for analysis {analysis_id}")
+    return {**job["result"], "speculative": True}
+
 # --- Generate Podcast Summary Script ---
-async def generate_podcast_summary(selected_text: str, analysis_data: dict) -> str:
+async def generate_podcast_summary(selected_text: str, analysis_data: dict, background: bool = False) -> str:
+    """Narration script for the podcast (background=True for low-priority speculative work)"""
     try:
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash-exp',  # Updated to use Gemini 2.5 Flash
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=2048,
-            )
+        config = llm_client.generation_config(
+            temperature=0.7,
+            top_p=0.8,
+            top_k=40,
+            max_output_tokens=2048,
         )
-        print(gemini_api_key)
         prompt = f"""
 Generate a podcast-style narration script.
 
@@ -1053,17 +1610,26 @@ Requirements:
 - End with a well-rounded closing thought or holistic perspective that ties everything together.
 - Output must be plain text only, with no special characters or metadata.
 """
-        response = model.generate_content(prompt)
-        print(response)
+        response = await call_with_retries(
+            "gemini", lambda: llm_client.generate(prompt, config, background=background), attempts=2
+        )
         return response.text.strip()
 
     except Exception as e:
         print(f"Error generating podcast summary: {e}")
+        record_outcome("gemini", "fallback")
         return f"Summary unavailable for: {selected_text[:100]}..."
     
-async def generate_podcast_audio(script: str, session_id: str) -> dict:
+async def generate_podcast_audio(script: str, session_id: str,
+                                 on_chunk: Optional[Callable[[int, int], Awaitable[None]]] = None,
+                                 on_start: Optional[Callable[[str], Awaitable[None]]] = None,
+                                 background: bool = False) -> dict:
     """
-    Generate audio from podcast script with Azure OpenAI TTS
+    Generate audio from podcast script with Azure OpenAI TTS (or the local stand-in, TTS_PROVIDER=local)
+    The script is synthesized in sentence chunks in parallel; the result reports per-chunk timings
+    Audio is cached by script, provider, deployment and voice, so a repeat script skips TTS
+    on_start(url) is awaited with the stream URL once the file being synthesized can be streamed
+    background=True synthesizes on the low-priority TTS stage (speculative podcasts)
     """
     try:
         print(f"Generating audio for session {session_id}")
@@ -1072,42 +1638,41 @@ async def generate_podcast_audio(script: str, session_id: str) -> dict:
         audio_dir = Path("storage/audio")
         audio_dir.mkdir(parents=True, exist_ok=True)
         
-        # Generate unique filename
-        audio_filename = f"podcast_{session_id}_{int(datetime.utcnow().timestamp())}.mp3"
-        audio_path = audio_dir / audio_filename
-        
-        # --- Try Azure OpenAI TTS ---
-        audio_created = False
-        try:
-            client = AzureOpenAI(
-                api_key=os.getenv("AZURE_TTS_KEY"),
-                api_version=os.getenv("AZURE_TTS_API_VERSION", "2025-03-01-preview"),
-                azure_endpoint=os.getenv("AZURE_TTS_ENDPOINT"),
-            )
-
-            deployment = os.getenv("AZURE_TTS_DEPLOYMENT", "tts")
-            voice = os.getenv("AZURE_TTS_VOICE", "alloy")  # alloy is a safe default
-
-            print(f"Using Azure OpenAI TTS (deployment={deployment}, voice={voice})...")
-            
-            response = client.audio.speech.create(
-                model=deployment,  # This must match your Azure deployment name
-                voice=voice,
-                input=script,
-            )
-            
-            with open(audio_path, "wb") as f:
-                f.write(response.read())
+        # Reuse audio already synthesized for this exact script and voice
+        tts = tts_settings()
+        cache_key = audio_cache_key(script, tts)
+        audio_path = await run_in_thread("storage", get_cached_audio, cache_key)
+        audio_cache = "hit" if audio_path is not None else "miss"
+        audio_created = audio_path is not None
+        tts_report = None
+        
+        # --- Try Azure OpenAI TTS: sentence chunks synthesized in parallel, stitched into one MP3 ---
+        if audio_created:
+            print(f"⚡ Audio cache hit, skipping TTS: {audio_path}")
+        else:
+            audio_path = audio_path_for(cache_key)
+            try:
+                stream_started = None
+                if on_start is not None:
+                    stream_started = lambda: on_start(audio_stream_url(audio_path.name))
+                tts_report = await synthesize_script(
+                    script, audio_path, on_chunk, on_start=stream_started, background=background
+                )
+                audio_created = True
+                print(f"TTS audio generated: {audio_path}")
+                await run_in_thread("storage", enforce_audio_quota, cache_key)
             
-            audio_created = True
-            print(f"Azure TTS audio generated: {audio_path}")
-        
-        except Exception as e:
-            print(f"Azure TTS failed: {e}, creating enhanced dummy audio...")
+            except CircuitOpenError as e:
+                print(f"⚡ {e.provider} circuit open, creating enhanced dummy audio...")
+            except Exception as e:
+                print(f"TTS failed: {e}, creating enhanced dummy audio...")
         
-        # --- Fallback: Create enhanced dummy MP3 ---
+        # --- Fallback: Create enhanced dummy MP3 (per request, never cached, so the next call retries TTS) ---
         if not audio_created or not audio_path.exists() or audio_path.stat().st_size < 1000:
-            create_enhanced_mp3(audio_path, script)
+            record_outcome(tts["provider"], "fallback")
+            audio_path = audio_dir / f"podcast_{session_id}_{int(datetime.utcnow().timestamp())}.mp3"
+            await run_in_thread("tts", create_enhanced_mp3, audio_path, script)
+        audio_filename = audio_path.name
         
         # Verify file exists
         if not audio_path.exists():
@@ -1119,7 +1684,7 @@ async def generate_podcast_audio(script: str, session_id: str) -> dict:
         duration_minutes = max(1, word_count / words_per_minute)
         duration_str = f"{int(duration_minutes)}:{int((duration_minutes % 1) * 60):02d}"
         
-        audio_url = f"http://localhost:8080/audio/{audio_filename}"
+        audio_url = audio_stream_url(audio_filename)
         
         print(f"Audio ready: {audio_path} ({audio_path.stat().st_size} bytes)")
         
@@ -1128,7 +1693,9 @@ async def generate_podcast_audio(script: str, session_id: str) -> dict:
             "duration": duration_str,
             "file_path": str(audio_path),
             "word_count": word_count,
-            "file_size": audio_path.stat().st_size
+            "file_size": audio_path.stat().st_size,
+            "audio_cache": audio_cache,
+            "tts": tts_report
         }
         
     except Exception as e:
@@ -1141,6 +1708,71 @@ async def generate_podcast_audio(script: str, session_id: str) -> dict:
         }
 
 
+def audio_stream_url(filename: str) -> str:
+    return f"http://localhost:8080/audio-stream/{filename}"
+
+
+@router.api_route("/audio-stream/{filename}", methods=["GET", "HEAD"])
+async def stream_audio(filename: str, request: Request):
+    """
+    Podcast audio for the player
+    Finished files support Range (single range), ETag and If-None-Match, so playback starts at once
+    and seeking doesn't re-download; while TTS is still writing the file, the bytes written so far
+    are streamed (chunked) and the response follows the file until synthesis completes
+    """
+    if Path(filename).name != filename or not filename.endswith(".mp3"):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    audio_path = AUDIO_DIR / filename
+
+    if not audio_path.exists():
+        part_path = find_part_file(audio_path)
+        if part_path is not None:
+            try:
+                part_file = open(part_path, "rb")
+            except FileNotFoundError:
+                part_file = None  # finished (or failed) just now
+            if part_file is not None:
+                if request.method == "HEAD":
+                    part_file.close()
+                    return Response(media_type="audio/mpeg", headers={"Cache-Control": "no-store"})
+                return StreamingResponse(
+                    follow_part_file(part_file, part_path), media_type="audio/mpeg",
+                    headers={"Cache-Control": "no-store"}
+                )
+
+    try:
+        stat = audio_path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    etag = file_etag(stat)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "public, max-age=86400"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # A Range for another version of the file (If-Range mismatch) gets the whole current file
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), stat.st_size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+
+    start, end = byte_range or (0, stat.st_size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    status_code = 200
+    if byte_range is not None:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, media_type="audio/mpeg", headers=headers)
+    return StreamingResponse(
+        iter_file_range(audio_path, start, end), status_code=status_code, media_type="audio/mpeg", headers=headers
+    )
+
+
 # Health check endpoint
 @router.get("/health/")
 async def health_check():
@@ -1172,7 +1804,7 @@ async def health_check():
 @router.get("/session/{session_id}/status/")
 async def get_session_status(session_id: str):
     """Get status of a user session with AI enhancement info"""
-    session_data = get_session_data(session_id)
+    session_data = await run_in_thread("storage", get_session_data, session_id)
     
     if not session_data:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -1194,8 +1826,8 @@ async def get_session_status(session_id: str):
 @router.delete("/session/{session_id}/")
 async def clear_session(session_id: str):
     """Clear session data"""
-    if session_id in SESSION_STORAGE:
-        del SESSION_STORAGE[session_id]
+    # Removal listeners drop the retrieval index and release the session's PDF blobs
+    if await run_in_thread("storage", SESSION_STORAGE.delete, session_id):
         return {"message": f"Session {session_id} cleared successfully"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -1203,7 +1835,7 @@ async def clear_session(session_id: str):
 @router.get("/session/{session_id}/podcasts/")
 async def get_session_podcasts(session_id: str):
     """Get all podcasts generated for a session"""
-    session_data = get_session_data(session_id)
+    session_data = await run_in_thread("storage", get_session_data, session_id)
     
     if not session_data:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -1225,7 +1857,9 @@ async def serve_pdf_file(filename: str):
     """Serve stored PDF files for preview"""
     from fastapi.responses import FileResponse
     
-    pdf_path = Path("storage/pdfs") / filename
+    # {unique_id}.pdf resolves to its content-addressed blob; older uploads live directly in storage/pdfs
+    unique_id = filename[:-len(".pdf")] if filename.endswith(".pdf") else filename
+    pdf_path = await run_in_thread("storage", resolve_reference, unique_id) or Path("storage/pdfs") / filename
     
     if pdf_path.exists():
         return FileResponse(
@@ -1246,7 +1880,8 @@ async def debug_all_sessions():
     """Debug endpoint to check all session data"""
     debug_info = []
     
-    for session_id, session_data in SESSION_STORAGE.items():
+    sessions = await run_in_thread("storage", lambda: list(SESSION_STORAGE.items()))
+    for session_id, session_data in sessions:
         prior_docs = session_data.get("prior_documents", [])
         docs_info = []
         
@@ -1264,42 +1899,32 @@ async def debug_all_sessions():
             "sample_docs": docs_info
         })
     
-    return {"sessions": debug_info, "total_sessions": len(SESSION_STORAGE)}
+    return {"sessions": debug_info, "total_sessions": len(sessions)}
 
 # FIXED PDF-METADATA ENDPOINT
 @router.get("/pdf-metadata/{pdf_id}")
 async def get_pdf_metadata(pdf_id: str):
     """Get PDF metadata and access URL by unique ID"""
     try:
-        print(f"🔍 Searching for PDF with ID: {pdf_id}")
-        print(f"📊 Total sessions: {len(SESSION_STORAGE)}")
-        
-        # Search across all sessions for this PDF ID
-        for session_id, session_data in SESSION_STORAGE.items():
-            prior_docs = session_data.get("prior_documents", [])
-            print(f"📂 Session {session_id}: {len(prior_docs)} prior docs")
-            
-            for idx, doc in enumerate(prior_docs):
-                doc_unique_id = doc.get("unique_id")
-                print(f"  Doc {idx}: ID={doc_unique_id}, filename={doc.get('original_filename')}")
-                
-                if doc_unique_id == pdf_id:
-                    print(f"Found PDF: {doc['original_filename']}")
-                    return {
-                        "success": True,
-                        "pdf_data": {
-                            "id": doc["unique_id"],
-                            "filename": doc["original_filename"],
-                            "file_url": f"http://localhost:8080/files/{doc['stored_filename']}",
-                            "file_path": doc.get("file_path"),
-                            "pages_count": doc.get("total_sections", 0),
-                            "upload_timestamp": doc.get("upload_timestamp"),
-                            "total_sections": doc.get("total_sections", 0)
-                        }
-                    }
+        # Single lookup in the global document index kept up to date by ingest and session removal
+        doc = await run_in_thread("storage", lookup_document, pdf_id)
+        
+        if doc is not None:
+            print(f"Found PDF: {doc['original_filename']}")
+            return {
+                "success": True,
+                "pdf_data": {
+                    "id": doc["unique_id"],
+                    "filename": doc["original_filename"],
+                    "file_url": f"http://localhost:8080/files/{doc['stored_filename']}",
+                    "file_path": doc.get("file_path"),
+                    "pages_count": doc.get("total_sections", 0),
+                    "upload_timestamp": doc.get("upload_timestamp"),
+                    "total_sections": doc.get("total_sections", 0)
+                }
+            }
         
         print(f"PDF not found: {pdf_id}")
-        print("💡 Available IDs:", [doc.get("unique_id") for session in SESSION_STORAGE.values() for doc in session.get("prior_documents", [])])
         
         raise HTTPException(status_code=404, detail=f"PDF not found: {pdf_id}")
         
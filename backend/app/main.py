@@ -1,7 +1,34 @@
+# `python app/main.py` hands over to `python -m uvicorn app.main:app` before importing anything:
+# spawned process pool workers re-import the __main__ script, and this module imports the whole app
+# (routes, the embedding model, the session stores) - uvicorn's __main__ is skipped by them instead
+if __name__ == "__main__":
+    import os
+    import sys
+    print("🎯 Starting Adobe Challenge - AI-Powered PDF Analysis with Preview...")
+    print("🔗 Frontend should connect to: http://localhost:8080")
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.execv(sys.executable, [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", backend_dir,
+        "--host", "0.0.0.0", "--port", "8080", "--log-level", "info"
+    ])
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.api.routes import router, SESSION_STORAGE  # ✅ FIXED IMPORT PATH
+from app.api.routes import (  # ✅ FIXED IMPORT PATH
+    router, SESSION_STORAGE, ANALYSIS_FLIGHTS, PODCAST_JOBS, SPECULATIVE_PODCASTS
+)
+from app.utils.executors import run_in_thread, shutdown_executors, executor_stats
+from app.utils.llm_client import get_model, llm_stats
+from app.utils.outline_cache import outline_cache_stats
+from app.utils.blob_store import blob_stats
+from app.utils.document_index import document_index_stats, index_session_documents
+from app.utils.insight_cache import insight_cache_stats
+from app.utils.audio_cache import audio_cache_stats
+from app.utils.section_candidates import section_candidate_stats
+from app.utils.resilience import resilience_stats
+from app.utils.cancellation import cancellation_stats
+from app.utils.podcast_jobs import prune_jobs
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -23,6 +50,24 @@ app = FastAPI(
     version="6.0.0-adobe-gemini-deep-pdf-preview"
 )
 
+def prepare_session_storage():
+    """Startup housekeeping for the session store, document ID index and podcast job records"""
+    # ✅ SESSIONS PERSIST ACROSS RESTARTS - only drop expired ones (set CLEAR_SESSIONS_ON_STARTUP=true for a fresh start)
+    if os.getenv("CLEAR_SESSIONS_ON_STARTUP", "false").lower() == "true":
+        print("🧹 Clearing session storage for fresh start...")
+        SESSION_STORAGE.clear()
+    else:
+        SESSION_STORAGE.prune()
+    print(f"📊 Active sessions: {len(SESSION_STORAGE)}")
+    
+    # Backfill the document ID index for sessions stored before it existed
+    if document_index_stats()["documents"] == 0:
+        for session_id, session_data in SESSION_STORAGE.items():
+            index_session_documents(session_id, session_data.get("prior_documents", []))
+    
+    # Forget podcast job records older than PODCAST_JOB_TTL_SECONDS
+    prune_jobs()
+
 # ✅ STARTUP EVENT - SESSION MANAGEMENT
 @app.on_event("startup")
 async def startup_event():
@@ -33,10 +78,8 @@ async def startup_event():
     # Create storage directories
     create_storage_directories()
     
-    # ✅ CLEAR SESSION STORAGE FOR DEV MODE
-    print("🧹 Clearing session storage for fresh start...")
-    SESSION_STORAGE.clear()
-    print(f"📊 Session storage cleared. Active sessions: {len(SESSION_STORAGE)}")
+    # Session store, document index and job records are SQLite: keep them off the event loop
+    await run_in_thread("storage", prepare_session_storage)
     
     print("🤖 Gemini AI integration active")
     print("👁️ PDF Preview functionality enabled")
@@ -45,12 +88,21 @@ async def startup_event():
     print("🌐 Server running on: http://localhost:8080")
     print("📖 API Documentation: http://localhost:8080/docs")
     
-    # Check Gemini configuration
+    # Check Gemini configuration and create the shared client once per worker
     if os.environ.get("GEMINI_API_KEY"):
+        get_model()
         print("🤖 Gemini AI: CONFIGURED ✅")
     else:
         print("⚠️ Gemini AI: NOT CONFIGURED - Set GEMINI_API_KEY environment variable")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background worker pools"""
+    await PODCAST_JOBS.stop()
+    await SPECULATIVE_PODCASTS.stop()
+    shutdown_executors()
+    print("👋 Worker pools stopped")
+
 # ✅ Create necessary directories for file storage
 def create_storage_directories():
     """Create storage directories if they don't exist"""
@@ -58,7 +110,8 @@ def create_storage_directories():
         "storage",
         "storage/pdfs", 
         "storage/audio",
-        "storage/temp"
+        "storage/temp",
+        "storage/indexes"
     ]
     
     for directory in directories:
@@ -113,20 +166,60 @@ async def debug_storage():
                 "writable": False
             }
     
+    sessions_count = await run_in_thread("storage", len, SESSION_STORAGE)
     return {
         "storage": storage_info,
-        "sessions_count": len(SESSION_STORAGE),
-        "total_sessions": len(SESSION_STORAGE)
+        "sessions_count": sessions_count,
+        "total_sessions": sessions_count
     }
 
+@app.get("/debug/executors")
+async def debug_executors():
+    """Worker pool sizes, per-stage concurrency limits and live counters"""
+    return {
+        **executor_stats(),
+        "llm": llm_stats(),
+        "analysis_single_flight": ANALYSIS_FLIGHTS.stats(),
+        "client_disconnects": cancellation_stats(),
+        "podcast_jobs": PODCAST_JOBS.stats(),
+        "speculative_podcasts": SPECULATIVE_PODCASTS.stats()
+    }
+
+@app.get("/debug/resilience")
+async def debug_resilience():
+    """Circuit breaker state and success / retry / failure / short-circuit / fallback counts per provider"""
+    return resilience_stats()
+
+def cache_stats() -> dict:
+    """Disk cache sizes and hit rates (scans cache directories and queries SQLite)"""
+    return {
+        "outline_cache": outline_cache_stats(),
+        "insight_cache": insight_cache_stats(),
+        "audio_cache": audio_cache_stats(),
+        "pdf_blobs": blob_stats(),
+        "sessions": SESSION_STORAGE.stats(),
+        "document_index": document_index_stats(),
+        "section_candidates": section_candidate_stats()
+    }
+
+@app.get("/debug/caches")
+async def debug_caches():
+    """Disk cache sizes and hit rates"""
+    return await run_in_thread("storage", cache_stats)
+
+def clear_sessions() -> int:
+    """Drop every session; removal listeners release indexes and blobs, so this is blocking I/O"""
+    count = len(SESSION_STORAGE)
+    SESSION_STORAGE.clear()
+    return count
+
 @app.get("/debug/clear-sessions")
 async def clear_all_sessions():
     """Clear all sessions (dev only)"""
-    count = len(SESSION_STORAGE)
-    SESSION_STORAGE.clear()
+    count = await run_in_thread("storage", clear_sessions)
     return {
         "message": f"Cleared {count} sessions", 
-        "remaining_sessions": len(SESSION_STORAGE),
+        "remaining_sessions": await run_in_thread("storage", len, SESSION_STORAGE),
         "status": "success"
     }
 
@@ -134,11 +227,12 @@ async def clear_all_sessions():
 @app.get("/")
 async def root():
     gemini_status = "configured" if os.environ.get("GEMINI_API_KEY") else "not configured"
+    active_sessions = await run_in_thread("storage", len, SESSION_STORAGE)
     
     return {
         "message": "Adobe Challenge - AI-Powered PDF Analysis API with Preview", 
         "status": "running",
-        "active_sessions": len(SESSION_STORAGE),
+        "active_sessions": active_sessions,
         "gemini_status": gemini_status,
         "port": 8080,
         "documentation": "http://localhost:8080/docs"
@@ -151,20 +245,6 @@ async def health_check():
     return {
         "status": "healthy",
         "message": "Adobe Challenge API with Deep Gemini AI and PDF Preview operational",
-        "sessions": len(SESSION_STORAGE),
+        "sessions": await run_in_thread("storage", len, SESSION_STORAGE),
         "version": "6.0.0-adobe-gemini-deep-pdf-preview"
     }
-
-if __name__ == "__main__":
-    import uvicorn
-    
-    print("🎯 Starting Adobe Challenge - AI-Powered PDF Analysis with Preview...")
-    print("🔗 Frontend should connect to: http://localhost:8080")
-    
-    uvicorn.run(
-        app, 
-        host="0.0.0.0", 
-        port=8080,
-        reload=False,
-        log_level="info"
-    )
@@ -790,10 +790,16 @@ class ProperPDFExtractor:
         pdf_input can be:
         - File path (string) for original functionality
         - PDF bytes (for backend integration)
+        - An open fitz.Document (caller keeps ownership and closes it)
         """
         try:
-            # Handle both file path and bytes input
-            if isinstance(pdf_input, (str, os.PathLike)):
+            owns_doc = True
+            # Handle file path, bytes and already-open document input
+            if isinstance(pdf_input, fitz.Document):
+                doc = pdf_input
+                title = "Document"
+                owns_doc = False
+            elif isinstance(pdf_input, (str, os.PathLike)):
                 # Original file path functionality
                 pdf_path = pdf_input
                 doc = fitz.open(pdf_path)
@@ -854,7 +860,8 @@ class ProperPDFExtractor:
             
             outline = self.validate_heading_hierarchy(sorted(outline, key=lambda x: x["page"]))
             
-            doc.close()
+            if owns_doc:
+                doc.close()
             return {"title": title, "outline": outline}
         except Exception as e:
             return {"title": f"Error: {e}", "outline": []}
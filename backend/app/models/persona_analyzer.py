@@ -970,21 +970,19 @@
 
 import os
 import json
-import fitz
 from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime
 import re
 from collections import Counter
 import numpy as np
-import google.generativeai as genai
+from app.utils import llm_client
+from app.utils.executors import run_in_process, run_in_thread
+# Full-text extraction lives with the other PDF parsing so the process pool can run it
+# without importing this module (and loading the SentenceTransformer) in every worker
+from app.utils.pdf_pipeline import extract_full_document_with_structure
 
 # ✅ Configure AI API (without branding)
-try:
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    print("✅ Advanced AI configured")
-except Exception as e:
-    print(f"⚠️ AI configuration failed: {e}")
 
 # ✅ Optional model loading (your original logic)
 try:
@@ -1004,27 +1002,6 @@ def extract_intelligent_keywords(text, top_k=8):
     scored = [(word, freq * (1 + len(word)*0.1)) for word, freq in word_freq.items()]
     return [word for word, _ in sorted(scored, key=lambda x: x[1], reverse=True)[:top_k]]
 
-def extract_full_document_with_structure(pdf_input):
-    """Extract full document - handles both file path and bytes"""
-    if isinstance(pdf_input, (str, os.PathLike)):
-        doc = fitz.open(pdf_input)
-    else:
-        doc = fitz.open(stream=pdf_input, filetype="pdf")
-    
-    full_text = ""
-    potential_titles = []
-    for page in doc:
-        text = page.get_text()
-        full_text += text + "\n"
-        lines = text.split("\n")[:10]
-        for line in lines:
-            if 10 < len(line) < 100 and line[0].isupper() and not line.lower().startswith("page") and len(line.split()) > 2:
-                potential_titles.append(line.strip())
-    
-    page_count = len(doc)
-    doc.close()
-    return full_text.strip(), page_count, potential_titles
-
 def extract_existing_titles_from_pdf(potential_titles, full_text):
     best = None
     best_score = 0
@@ -1076,14 +1053,11 @@ def calculate_document_relevance(text, persona_embedding):
         return 0.0
 
 # ✅ ENHANCED GENERATE INSIGHTS FUNCTION (Updated Version)
-def generate_insights_with_gemini(text, persona_string):
+async def generate_insights_with_gemini(text, persona_string):
     """Generate insights using advanced AI analysis"""
     try:
         print(f"🤖 Generating insights for {persona_string} using advanced AI...")
         
-        # Initialize AI model (no branding)
-        ai_model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
         # ✅ ENHANCED PROMPTS - Much Better Than Before!
         prompt = f"""
         You are a senior expert analyst specializing in document analysis for {persona_string} professionals. 
@@ -1119,10 +1093,10 @@ def generate_insights_with_gemini(text, persona_string):
         
         print(f"📝 Advanced prompt created, processing with AI...")
         
-        # Generate response with optimized settings
-        response = ai_model.generate_content(
+        # Generate response with optimized settings (shared async client, bounded concurrency)
+        response = await llm_client.generate(
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            llm_client.generation_config(
                 max_output_tokens=1000,
                 temperature=0.4,  # Lower temperature for more focused responses
                 top_p=0.8,
@@ -1233,7 +1207,7 @@ def generate_fallback_insights(persona_string):
     return persona_insights.get(persona_string, persona_insights["business_analyst"])
 
 # ✅ Updated analyze function with AI integration
-def analyze_with_persona(pdf_input, persona_string):
+async def analyze_with_persona(pdf_input, persona_string):
     """
     Main analysis function for backend integration with enhanced AI
     pdf_input: PDF bytes from backend
@@ -1246,8 +1220,8 @@ def analyze_with_persona(pdf_input, persona_string):
         persona = {"role": persona_string}
         job = {"task": f"Analyze document for {persona_string} perspective"}
         
-        # Extract document content
-        full_text, pages, titles = extract_full_document_with_structure(pdf_input)
+        # Extract document content (CPU-bound PyMuPDF parse, on the ingest process pool)
+        full_text, pages, titles = await run_in_process("pdf_parse", extract_full_document_with_structure, pdf_input)
         
         if len(full_text) < 100:
             return {"error": "Text too short for analysis"}
@@ -1264,15 +1238,17 @@ def analyze_with_persona(pdf_input, persona_string):
         
         # Calculate relevance
         if model:
-            persona_embedding = model.encode(f"{persona_string}. Task: Analyze document", convert_to_tensor=True)
-            relevance = calculate_document_relevance(full_text, persona_embedding)
+            persona_embedding = await run_in_thread(
+                "embedding", model.encode, f"{persona_string}. Task: Analyze document", convert_to_tensor=True
+            )
+            relevance = await run_in_thread("embedding", calculate_document_relevance, full_text, persona_embedding)
         else:
             relevance = 0.75  # Default score if model not available
         
         print(f"📊 Relevance score: {relevance:.2f}")
         
         # ✅ Generate insights using enhanced AI (or fallback)
-        insights = generate_insights_with_gemini(summary, persona_string)
+        insights = await generate_insights_with_gemini(summary, persona_string)
         
         # Return in backend-compatible format
         result = {
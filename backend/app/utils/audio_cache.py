@@ -0,0 +1,38 @@
+import os
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from app.utils.disk_cache import DiskCache
+
+# Generated audio lives where /audio is served from; the whole directory (including older
+# podcast_* files) is kept under the quota, least recently generated or reused first
+AUDIO_DIR = Path("storage/audio")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+_cache = DiskCache(AUDIO_DIR, AUDIO_CACHE_MAX_BYTES)
+
+
+def audio_cache_key(script: str, settings: dict) -> str:
+    """Hash of the script text plus the TTS provider, deployment and voice that would speak it"""
+    digest = hashlib.sha256(f"{settings['provider']}|{settings['deployment']}|{settings['voice']}|".encode())
+    digest.update(script.strip().encode())
+    return digest.hexdigest()
+
+
+def get_cached_audio(key: str) -> Optional[Path]:
+    return _cache.get_path(key, ".mp3")
+
+
+def audio_path_for(key: str) -> Path:
+    """Where newly synthesized audio for key is written (then served as /audio/<name>)"""
+    return _cache.path_for(key, ".mp3")
+
+
+def enforce_audio_quota(keep: Optional[str] = None):
+    """Drop least recently used audio files (never keep, the one just written) until under AUDIO_CACHE_MAX_BYTES"""
+    _cache.evict(keep)
+
+
+def audio_cache_stats() -> dict:
+    return _cache.stats()
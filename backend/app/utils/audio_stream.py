@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+from app.utils.executors import run_in_thread
+
+# Reads run on their own "audio" executor stage, so long-lived players never hold the
+# "storage" slots that session, blob and cache I/O wait on
+AUDIO_STREAM_CHUNK_BYTES = 64 * 1024
+# How long a growing .part file may stay unchanged before a live stream gives up on it
+AUDIO_STREAM_IDLE_SECONDS = float(os.getenv("AUDIO_STREAM_IDLE_SECONDS", "60"))
+_POLL_SECONDS = 0.2
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match / If-Range comparison (weak, as for GET); "*" matches any existing file"""
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single "bytes=" range as inclusive (start, end), or None to send the whole file
+    Multi-range and malformed headers are ignored (a full 200 response is always allowed);
+    ranges past the end raise RangeNotSatisfiable
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if end_text and end < start:
+        return None  # last < first is syntactically invalid (RFC 7233 2.1): ignore the header
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def _read_at(f, offset: int, length: int) -> bytes:
+    f.seek(offset)
+    return f.read(length)
+
+
+async def iter_file_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    """Bytes start..end (inclusive) of a finished file, read off the event loop in chunks"""
+    with open(path, "rb") as f:
+        offset = start
+        while offset <= end:
+            data = await run_in_thread(
+                "audio", _read_at, f, offset, min(AUDIO_STREAM_CHUNK_BYTES, end - offset + 1)
+            )
+            if not data:
+                break
+            offset += len(data)
+            yield data
+
+
+def find_part_file(audio_path: Path) -> Optional[Path]:
+    """The .part file of an in-progress synthesis of audio_path (see tts.synthesize_script)"""
+    newest, newest_mtime = None, 0.0
+    for part in audio_path.parent.glob(f"{audio_path.name}.*.part"):
+        try:
+            mtime = part.stat().st_mtime
+        except FileNotFoundError:
+            continue  # finished (renamed) or failed while listing
+        if newest is None or mtime > newest_mtime:
+            newest, newest_mtime = part, mtime
+    return newest
+
+
+async def follow_part_file(f, part_path: Path) -> AsyncIterator[bytes]:
+    """
+    Stream a .part file (f, opened by the caller) while TTS is still appending segments to it
+    The open descriptor survives the final rename, so once the .part name disappears everything
+    written so far is drained and the stream ends (it ends early if synthesis failed or stalls)
+    """
+    with f:
+        last_data = time.monotonic()
+        while True:
+            data = await run_in_thread("audio", f.read, AUDIO_STREAM_CHUNK_BYTES)
+            if data:
+                last_data = time.monotonic()
+                yield data
+                continue
+            if not part_path.exists():
+                while True:
+                    data = await run_in_thread("audio", f.read, AUDIO_STREAM_CHUNK_BYTES)
+                    if not data:
+                        return
+                    yield data
+            if time.monotonic() - last_data > AUDIO_STREAM_IDLE_SECONDS:
+                print(f"Audio stream of {part_path.name} stalled, closing")
+                return
+            await asyncio.sleep(_POLL_SECONDS)
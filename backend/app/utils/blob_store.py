@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+# Content-addressed PDF blobs: one file per SHA-256, shared by every document that references it
+BLOB_DIR = Path(os.getenv("BLOB_STORE_DIR", "storage/pdfs/blobs"))
+BLOB_DB_PATH = Path(os.getenv("BLOB_STORE_DB", "storage/blobs.sqlite3"))
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+@contextmanager
+def _connect():
+    """Short-lived connection; BEGIN IMMEDIATE serialises writers across threads and processes"""
+    global _schema_ready
+    BLOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(BLOB_DB_PATH, timeout=30, isolation_level=None)
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                conn.executescript("""
+                    PRAGMA journal_mode=WAL;
+                    CREATE TABLE IF NOT EXISTS blobs (
+                        sha256 TEXT PRIMARY KEY,
+                        path TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        refcount INTEGER NOT NULL DEFAULT 0,
+                        created_at TEXT NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS blob_refs (
+                        ref_id TEXT PRIMARY KEY,
+                        sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+                        created_at TEXT NOT NULL
+                    );
+                """)
+                _schema_ready = True
+        yield conn
+    finally:
+        conn.close()
+
+
+def blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / f"{sha256}.pdf"
+
+
+def store_and_reference(ref_id: str, content: bytes, sha256: str) -> dict:
+    """
+    Point ref_id (a document unique_id) at the blob for content, writing the file only if
+    these bytes have never been stored. Runs in one write transaction so garbage collection
+    can't remove the blob in between
+    """
+    path = blob_path(sha256)
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deduplicated = path.exists() and conn.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone() is not None
+
+            if not deduplicated:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                tmp_path.write_bytes(content)
+                os.replace(tmp_path, path)
+                conn.execute(
+                    "INSERT OR REPLACE INTO blobs (sha256, path, size, refcount, created_at) "
+                    "VALUES (?, ?, ?, COALESCE((SELECT refcount FROM blobs WHERE sha256 = ?), 0), ?)",
+                    (sha256, str(path), len(content), sha256, datetime.utcnow().isoformat())
+                )
+
+            if conn.execute("SELECT 1 FROM blob_refs WHERE ref_id = ?", (ref_id,)).fetchone() is None:
+                conn.execute(
+                    "INSERT INTO blob_refs (ref_id, sha256, created_at) VALUES (?, ?, ?)",
+                    (ref_id, sha256, datetime.utcnow().isoformat())
+                )
+                conn.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    print(f"{'♻️ Reused' if deduplicated else '💾 Stored'} blob {sha256[:12]}... for {ref_id}")
+    return {"path": path, "deduplicated": deduplicated}
+
+
+def resolve_reference(ref_id: str) -> Optional[Path]:
+    """Blob file for a document unique_id, or None if it was never stored here"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT b.path FROM blob_refs r JOIN blobs b ON b.sha256 = r.sha256 WHERE r.ref_id = ?",
+            (ref_id,)
+        ).fetchone()
+    return Path(row[0]) if row else None
+
+
+def release_references(ref_ids) -> int:
+    """Drop document references; blobs whose refcount hits zero are left for collect_garbage"""
+    released = 0
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for ref_id in ref_ids:
+                row = conn.execute("SELECT sha256 FROM blob_refs WHERE ref_id = ?", (ref_id,)).fetchone()
+                if row is None:
+                    continue
+                conn.execute("DELETE FROM blob_refs WHERE ref_id = ?", (ref_id,))
+                conn.execute("UPDATE blobs SET refcount = MAX(refcount - 1, 0) WHERE sha256 = ?", (row[0],))
+                released += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return released
+
+
+def collect_garbage() -> int:
+    """Delete blobs that no document references any more"""
+    removed = 0
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT sha256, path FROM blobs WHERE refcount <= 0").fetchall()
+            for sha256, path in rows:
+                try:
+                    Path(path).unlink()
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                removed += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    if removed:
+        print(f"🧹 Blob GC removed {removed} unreferenced PDFs")
+    return removed
+
+
+def blob_stats() -> dict:
+    with _connect() as conn:
+        blobs, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        refs = conn.execute("SELECT COUNT(*) FROM blob_refs").fetchone()[0]
+        unreferenced = conn.execute("SELECT COUNT(*) FROM blobs WHERE refcount <= 0").fetchone()[0]
+    return {
+        "blobs": blobs,
+        "bytes": total_bytes,
+        "references": refs,
+        "unreferenced_blobs": unreferenced
+    }
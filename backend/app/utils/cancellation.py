@@ -0,0 +1,44 @@
+import os
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+_stats = {"watched": 0, "cancelled": 0}
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before its response was ready"""
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await work while polling the request for a client disconnect
+    On disconnect the work is cancelled - pending Gemini / Azure calls and queued executor tasks
+    with it, before anything is stored in the session - and ClientDisconnected is raised
+    """
+    _stats["watched"] += 1
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                _stats["cancelled"] += 1
+                print(f"🔌 Client disconnected from {request.url.path}, cancelling its work")
+                task.cancel()
+                # Let the work unwind (release semaphores, record outcomes) before returning
+                await asyncio.wait({task})
+                raise ClientDisconnected(request.url.path)
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def cancellation_stats() -> dict:
+    return {"poll_seconds": DISCONNECT_POLL_SECONDS, **_stats}
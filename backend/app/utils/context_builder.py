@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import math
+from typing import List, Tuple
+
+# Evidence budget for the insights prompt (instruction text is reported but not budgeted)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("INSIGHT_CONTEXT_TOKEN_BUDGET", "1200"))
+CONTEXT_MAX_SNIPPETS = int(os.getenv("INSIGHT_CONTEXT_MAX_SNIPPETS", "8"))
+SNIPPET_MAX_CHARS = 800
+# Word-set Jaccard similarity at or above which a snippet repeats one already packed
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("INSIGHT_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# Don't bother packing a truncated snippet smaller than this
+MIN_SNIPPET_TOKENS = 40
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English); no tokenizer dependency"""
+    return math.ceil(len(text) / 4)
+
+
+def _word_set(text: str) -> frozenset:
+    return frozenset(_WORD_RE.findall(text.lower()))
+
+
+def _is_near_duplicate(words: frozenset, packed: List[frozenset]) -> bool:
+    for other in packed:
+        union = len(words | other)
+        if union == 0 or len(words & other) / union >= NEAR_DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def _context_entry(snippet: dict, content: str) -> dict:
+    return {
+        "document": snippet["document_name"],
+        "page": snippet.get("page", "Unknown"),
+        "content": content,
+        "relevance_score": snippet["similarity_score"],
+        "section_level": snippet.get("section_level", 1)
+    }
+
+
+def build_context(snippets: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                  max_snippets: int = CONTEXT_MAX_SNIPPETS) -> Tuple[List[dict], dict]:
+    """
+    Pack the highest-scoring, non-duplicate snippets into the token budget
+    Returns the context entries for the prompt and a report of what was kept and dropped
+    """
+    ranked = sorted(snippets, key=lambda s: s["similarity_score"], reverse=True)
+    context, packed_words = [], []
+    used_tokens = 0
+    duplicates = 0
+    truncated = 0
+
+    for snippet in ranked:
+        if len(context) >= max_snippets:
+            break
+
+        content = snippet["section_text"][:SNIPPET_MAX_CHARS]
+        words = _word_set(content)
+        if _is_near_duplicate(words, packed_words):
+            duplicates += 1
+            continue
+
+        entry = _context_entry(snippet, content)
+        cost = estimate_tokens(json.dumps(entry))
+        remaining = token_budget - used_tokens
+        if cost > remaining:
+            # Trim the content to the leftover budget, or stop once it is too small to be useful
+            overhead = cost - estimate_tokens(content)
+            keep_chars = (remaining - overhead) * 4
+            if keep_chars < MIN_SNIPPET_TOKENS * 4:
+                break
+            entry = _context_entry(snippet, content[:keep_chars])
+            cost = estimate_tokens(json.dumps(entry))
+            truncated += 1
+
+        context.append(entry)
+        packed_words.append(words)
+        used_tokens += cost
+
+    report = {
+        "snippets_considered": len(snippets),
+        "snippets_used": len(context),
+        "near_duplicates_dropped": duplicates,
+        "snippets_truncated": truncated,
+        "context_tokens": used_tokens,
+        "token_budget": token_budget
+    }
+    return context, report
+
+
+def describe_prompt(prompt: str, context_report: dict) -> dict:
+    """Prompt size summary for response metadata and logs"""
+    prompt_tokens = estimate_tokens(prompt)
+    return {
+        **context_report,
+        "instruction_tokens": max(prompt_tokens - context_report["context_tokens"], 0),
+        "prompt_tokens": prompt_tokens,
+        "prompt_chars": len(prompt)
+    }
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class DiskCache:
+    """
+    Directory of cache entries with size-bounded LRU eviction and optional TTL
+    An entry is one or more files named "<key><suffix>" (keys must not contain dots).
+    File mtime records when the entry was written (TTL) and atime is bumped on every hit,
+    so eviction can drop the least recently used keys first
+    "<key><suffix>.<id>.part" files are entries still being written in place (see tts.synthesize_script):
+    they are not part of any entry, so eviction and delete never remove them
+    """
+
+    def __init__(self, directory, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, suffix: str) -> Path:
+        return self.directory / f"{key}{suffix}"
+
+    def _fresh_path(self, key: str, suffix: str) -> Optional[Path]:
+        """Return the entry file if present and not expired, bumping its recency"""
+        path = self.path_for(key, suffix)
+        try:
+            stat = path.stat()
+            now = time.time()
+            if self.ttl_seconds is not None and now - stat.st_mtime > self.ttl_seconds:
+                self.delete(key)
+                return None
+            os.utime(path, (now, stat.st_mtime))
+            return path
+        except FileNotFoundError:
+            return None
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _write(self, key: str, suffix: str, write_fn):
+        """Write via a temp file and rename so readers never see partial entries"""
+        path = self.path_for(key, suffix)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            write_fn(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self.evict()
+        return path
+
+    def get_path(self, key: str, suffix: str) -> Optional[Path]:
+        """Path of a fresh entry written in place by the caller (e.g. via path_for), bumping its recency"""
+        path = self._fresh_path(key, suffix)
+        self._record(path is not None)
+        return path
+
+    def get_json(self, key: str, suffix: str = ".json"):
+        path = self._fresh_path(key, suffix)
+        if path is None:
+            self._record(False)
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cache entry unreadable, dropping {path.name}: {e}")
+            self.delete(key)
+            self._record(False)
+            return None
+        self._record(True)
+        return value
+
+    def put_json(self, key: str, value, suffix: str = ".json") -> Path:
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+        return self._write(key, suffix, write)
+
+    def get_array(self, key: str, suffix: str = ".npy") -> Optional[np.ndarray]:
+        path = self._fresh_path(key, suffix)
+        if path is None:
+            self._record(False)
+            return None
+        try:
+            value = np.load(path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            print(f"Cache entry unreadable, dropping {path.name}: {e}")
+            self.delete(key)
+            self._record(False)
+            return None
+        self._record(True)
+        return value
+
+    def put_array(self, key: str, value: np.ndarray, suffix: str = ".npy") -> Path:
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                np.save(f, value, allow_pickle=False)
+        return self._write(key, suffix, write)
+
+    def delete(self, key: str):
+        for path in self.directory.glob(f"{key}.*"):
+            if path.name.endswith(".part"):
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _entries(self) -> dict:
+        """Group files by key: key -> (total_bytes, last_access, written)"""
+        entries = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.startswith(".") or entry.name.endswith(".part"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = entry.name.split(".", 1)[0]
+            size, last_access, written = entries.get(key, (0, 0.0, stat.st_mtime))
+            entries[key] = (size + stat.st_size, max(last_access, stat.st_atime), min(written, stat.st_mtime))
+        return entries
+
+    def evict(self, keep: Optional[str] = None):
+        """Drop expired entries, then least recently used ones (except keep) until under max_bytes"""
+        with self._lock:
+            entries = self._entries()
+            now = time.time()
+
+            if self.ttl_seconds is not None:
+                for key, (_, _, written) in list(entries.items()):
+                    if now - written > self.ttl_seconds:
+                        self.delete(key)
+                        del entries[key]
+
+            total = sum(size for size, _, _ in entries.values())
+            if total <= self.max_bytes:
+                return
+
+            for key, (size, _, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self.delete(key)
+                total -= size
+                print(f"🧹 Evicted cache entry {key} from {self.directory}")
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "directory": str(self.directory),
+            "entries": len(entries),
+            "bytes": sum(size for size, _, _ in entries.values()),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,90 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+# Global unique_id -> document record lookup, shared by every session and API worker
+DOCUMENT_INDEX_DB_PATH = Path(os.getenv("DOCUMENT_INDEX_DB", "storage/documents.sqlite3"))
+
+# Document fields needed to answer /pdf-metadata without loading the owning session
+RECORD_FIELDS = (
+    "unique_id", "original_filename", "stored_filename", "file_path",
+    "total_sections", "upload_timestamp", "content_size"
+)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+@contextmanager
+def _connect():
+    global _schema_ready
+    DOCUMENT_INDEX_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DOCUMENT_INDEX_DB_PATH, timeout=30, isolation_level=None)
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                conn.executescript("""
+                    PRAGMA journal_mode=WAL;
+                    CREATE TABLE IF NOT EXISTS documents (
+                        unique_id TEXT PRIMARY KEY,
+                        session_id TEXT NOT NULL,
+                        record TEXT NOT NULL,
+                        indexed_at TEXT NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS documents_session ON documents(session_id);
+                """)
+                _schema_ready = True
+        yield conn
+    finally:
+        conn.close()
+
+
+def index_session_documents(session_id: str, docs: List[dict]) -> int:
+    """Replace the session's entries with records for docs (re-ingest drops the old set)"""
+    now = datetime.utcnow().isoformat()
+    rows = [
+        (doc["unique_id"], session_id, json.dumps({field: doc.get(field) for field in RECORD_FIELDS}), now)
+        for doc in docs if doc.get("unique_id")
+    ]
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM documents WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (unique_id, session_id, record, indexed_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return len(rows)
+
+
+def lookup_document(unique_id: str) -> Optional[dict]:
+    """Document record for unique_id plus its session_id, or None"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT session_id, record FROM documents WHERE unique_id = ?", (unique_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {**json.loads(row[1]), "session_id": row[0]}
+
+
+def remove_session_documents(session_id: str) -> int:
+    with _connect() as conn:
+        return conn.execute("DELETE FROM documents WHERE session_id = ?", (session_id,)).rowcount
+
+
+def document_index_stats() -> dict:
+    with _connect() as conn:
+        documents, sessions = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT session_id) FROM documents"
+        ).fetchone()
+    return {"documents": documents, "sessions": sessions}
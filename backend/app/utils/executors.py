@@ -0,0 +1,183 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Pool sizes - with several uvicorn workers (WEB_CONCURRENCY) the cores are split between their process pools
+API_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY") or "1"))
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", str(max(1, (os.cpu_count() or 1) // API_WORKERS))))
+THREAD_POOL_WORKERS = int(os.getenv("THREAD_POOL_WORKERS", "16"))
+# Workers are spawned, not forked: forking a process that already runs thread-pool and torch threads
+# can deadlock on locks held at fork time. A spawned worker imports only the modules of the function
+# it runs (app.utils.pdf_pipeline) - plus the process's __main__ script, so the server must be started
+# via uvicorn (python -m uvicorn app.main:app; app/main.py hands over to it) rather than as a script
+PROCESS_POOL_START_METHOD = os.getenv("PROCESS_POOL_START_METHOD", "spawn")
+
+# Max concurrent calls per stage, override with EXECUTOR_LIMIT_<STAGE> (e.g. EXECUTOR_LIMIT_TTS=8)
+DEFAULT_STAGE_LIMITS = {
+    "pdf_parse": PROCESS_POOL_WORKERS,  # PyMuPDF outline extraction (process pool)
+    "embedding": 2,                     # SentenceTransformer / TF-IDF index builds
+    "retrieval": 8,                     # per-selection scoring
+    "tts": 4,                           # Azure TTS calls
+    "tts_background": 1,                # Azure TTS calls of speculative podcasts (low priority)
+    "storage": 8,                       # local cache / blob file I/O
+    "audio": 4                          # /audio-stream/ file reads (kept apart from storage)
+}
+
+STAGE_LIMITS = {
+    stage: int(os.getenv(f"EXECUTOR_LIMIT_{stage.upper()}", str(limit)))
+    for stage, limit in DEFAULT_STAGE_LIMITS.items()
+}
+
+_process_pool = None
+_thread_pool = None
+_stage_semaphores = {}
+_stage_stats = {
+    stage: {"running": 0, "waiting": 0, "completed": 0, "failed": 0, "cancelled": 0} for stage in STAGE_LIMITS
+}
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Create the process pool on first use"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS, mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD)
+        )
+        print(f"⚙️ Process pool started with {PROCESS_POOL_WORKERS} workers ({PROCESS_POOL_START_METHOD})")
+    return _process_pool
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Create the thread pool on first use"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS, thread_name_prefix="blocking")
+        print(f"⚙️ Thread pool started with {THREAD_POOL_WORKERS} workers")
+    return _thread_pool
+
+
+def _stage_semaphore(stage: str) -> asyncio.Semaphore:
+    if stage not in STAGE_LIMITS:
+        raise ValueError(f"Unknown executor stage: {stage}")
+    if stage not in _stage_semaphores:
+        _stage_semaphores[stage] = asyncio.Semaphore(STAGE_LIMITS[stage])
+    return _stage_semaphores[stage]
+
+
+async def _run_stage(stage: str, get_executor, fn, *args, **kwargs):
+    """Wait for a stage slot, then run fn on the executor without blocking the event loop"""
+    stats = _stage_stats[stage]
+    semaphore = _stage_semaphore(stage)
+    loop = asyncio.get_running_loop()
+
+    stats["waiting"] += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        stats["waiting"] -= 1
+
+    stats["running"] += 1
+    executor = get_executor()
+    future = None
+    slot_held = False
+    try:
+        future = executor.submit(functools.partial(fn, *args, **kwargs))
+        result = await asyncio.wrap_future(future)
+        stats["completed"] += 1
+        return result
+    except BrokenProcessPool:
+        # A worker died (e.g. a crash inside MuPDF) - start a fresh pool next time
+        stats["failed"] += 1
+        print("⚠️ Process pool broken, recreating on next use")
+        _reset_process_pool(executor)
+        raise
+    except asyncio.CancelledError:
+        # The caller went away: a queued call is dropped; a running one can't be interrupted,
+        # so it keeps its stage slot until it returns and the stage limit stays honest
+        stats["cancelled"] += 1
+        if future is not None and not future.cancel() and not future.done():
+            slot_held = True
+            future.add_done_callback(lambda _: _release_from_worker(loop, stage))
+        raise
+    except BaseException:
+        stats["failed"] += 1
+        raise
+    finally:
+        if not slot_held:
+            _release_stage(stage)
+
+
+def _release_stage(stage: str):
+    _stage_stats[stage]["running"] -= 1
+    _stage_semaphore(stage).release()
+
+
+def _release_from_worker(loop: asyncio.AbstractEventLoop, stage: str):
+    try:
+        loop.call_soon_threadsafe(_release_stage, stage)
+    except RuntimeError:
+        pass  # event loop already closed (shutdown)
+
+
+async def run_in_thread(stage: str, fn, *args, **kwargs):
+    """Run blocking I/O or GIL-releasing work (network clients, numpy, torch) on the thread pool"""
+    return await _run_stage(stage, get_thread_pool, fn, *args, **kwargs)
+
+
+async def run_in_process(stage: str, fn, *args, **kwargs):
+    """Run pure-Python CPU work on the process pool; fn and its arguments must be picklable"""
+    return await _run_stage(stage, get_process_pool, fn, *args, **kwargs)
+
+
+async def map_in_process(stage: str, fn, items: list) -> list:
+    """
+    Run fn(item) for every item on the process pool
+    Results come back in input order; a failed item yields its exception instead of aborting the rest
+    A worker crash breaks the pool for every item in flight, so those items are retried once on the
+    fresh pool - one at a time, so an item that crashes its worker again only fails itself
+    """
+    results = await asyncio.gather(*(run_in_process(stage, fn, item) for item in items), return_exceptions=True)
+    broken = [i for i, result in enumerate(results) if isinstance(result, BrokenProcessPool)]
+    if broken:
+        print(f"🔁 Retrying {len(broken)} items interrupted by a process pool crash")
+    for i in broken:
+        try:
+            results[i] = await run_in_process(stage, fn, items[i])
+        except Exception as e:
+            results[i] = e
+    return results
+
+
+def executor_stats() -> dict:
+    """Pool sizes plus per-stage limits and live counters"""
+    return {
+        "pid": os.getpid(),
+        "api_workers": API_WORKERS,
+        "process_pool_workers": PROCESS_POOL_WORKERS,
+        "thread_pool_workers": THREAD_POOL_WORKERS,
+        "stages": {
+            stage: {"limit": STAGE_LIMITS[stage], **_stage_stats[stage]}
+            for stage in STAGE_LIMITS
+        }
+    }
+
+
+def _reset_process_pool(broken_pool: ProcessPoolExecutor = None):
+    global _process_pool
+    if broken_pool is not None and broken_pool is not _process_pool:
+        return  # already replaced by another caller
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def shutdown_executors():
+    """Stop worker pools on application shutdown"""
+    global _thread_pool
+    _reset_process_pool()
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
@@ -0,0 +1,51 @@
+import os
+import hashlib
+from pathlib import Path
+from typing import List, Optional
+
+from app.utils.disk_cache import DiskCache
+from app.utils.context_builder import CONTEXT_MAX_SNIPPETS, CONTEXT_TOKEN_BUDGET
+from app.utils.llm_client import GEMINI_MODEL
+
+# Bump whenever the insight prompt or its response parsing changes so stale entries are ignored
+PROMPT_VERSION = "2"
+
+INSIGHT_CACHE_DIR = Path(os.getenv("INSIGHT_CACHE_DIR", "storage/cache/insights"))
+INSIGHT_CACHE_MAX_BYTES = int(os.getenv("INSIGHT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+INSIGHT_CACHE_TTL_SECONDS = float(os.getenv("INSIGHT_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+
+_cache = DiskCache(INSIGHT_CACHE_DIR, INSIGHT_CACHE_MAX_BYTES, INSIGHT_CACHE_TTL_SECONDS)
+
+
+def normalize_selection(selection_text: str) -> str:
+    """Case and whitespace differences from re-selecting the same paragraph map to one entry"""
+    return " ".join(selection_text.lower().split())
+
+
+def insight_cache_key(selection_text: str, snippets: List[dict]) -> str:
+    """
+    Hash of the normalized selection, the retrieved sections (in rank order), model, prompt version
+    and context budget (a different budget packs a different prompt)
+    Sections are identified by their PDF's content hash, not the per-upload unique_id, so the same PDFs
+    uploaded to another session (or re-ingested) hit; the file name is part of the prompt, so it is keyed too
+    """
+    digest = hashlib.sha256()
+    digest.update(f"p{PROMPT_VERSION}|{GEMINI_MODEL}|{CONTEXT_TOKEN_BUDGET}/{CONTEXT_MAX_SNIPPETS}|".encode())
+    digest.update(normalize_selection(selection_text).encode())
+    for snippet in snippets:
+        document = snippet.get("file_hash") or snippet.get("unique_id")
+        digest.update(f"|{document}:{snippet.get('section_index')}:{snippet.get('document_name')}".encode())
+    return digest.hexdigest()
+
+
+def get_cached_insights(selection_text: str, snippets: List[dict]) -> Optional[dict]:
+    return _cache.get_json(insight_cache_key(selection_text, snippets))
+
+
+def put_cached_insights(selection_text: str, snippets: List[dict], insights: dict):
+    """Store model-generated insights (fallback insights are not cached, so a later call can retry Gemini)"""
+    _cache.put_json(insight_cache_key(selection_text, snippets), insights)
+
+
+def insight_cache_stats() -> dict:
+    return {"prompt_version": PROMPT_VERSION, **_cache.stats()}
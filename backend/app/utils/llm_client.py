@@ -0,0 +1,136 @@
+import os
+import asyncio
+from typing import AsyncIterator, Optional
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL") or "gemini-2.0-flash-exp"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Background work (speculative podcasts) has its own smaller pool of slots, so it never takes
+# one an interactive request is waiting for
+LLM_BACKGROUND_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_CONCURRENCY", "1"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+_model = None
+_semaphores = {}
+_stats = {"in_flight": 0, "waiting": 0, "completed": 0, "failed": 0, "timeouts": 0}
+
+
+def is_configured() -> bool:
+    return bool(os.environ.get("GEMINI_API_KEY"))
+
+
+def get_model() -> genai.GenerativeModel:
+    """Configure the SDK and create the shared model on first use; every call reuses its client channel"""
+    global _model
+    if _model is None:
+        if is_configured():
+            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+            print(f"Gemini AI configured successfully ({GEMINI_MODEL})")
+        else:
+            print("GEMINI_API_KEY not found in environment")
+        _model = genai.GenerativeModel(GEMINI_MODEL)
+    return _model
+
+
+def generation_config(**kwargs) -> genai.types.GenerationConfig:
+    return genai.types.GenerationConfig(**kwargs)
+
+
+def _get_semaphore(background: bool = False) -> asyncio.Semaphore:
+    if background not in _semaphores:
+        _semaphores[background] = asyncio.Semaphore(LLM_BACKGROUND_CONCURRENCY if background else LLM_MAX_CONCURRENCY)
+    return _semaphores[background]
+
+
+async def generate(prompt: str, config: Optional[genai.types.GenerationConfig] = None,
+                   timeout: Optional[float] = None, background: bool = False):
+    """
+    Run one completion with the async API
+    At most LLM_MAX_CONCURRENCY calls are in flight (LLM_BACKGROUND_CONCURRENCY more for background calls);
+    a call slower than the timeout raises asyncio.TimeoutError
+    """
+    model = get_model()
+    semaphore = _get_semaphore(background)
+
+    _stats["waiting"] += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _stats["waiting"] -= 1
+
+    _stats["in_flight"] += 1
+    try:
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, generation_config=config),
+            timeout=timeout or LLM_TIMEOUT_SECONDS
+        )
+        _stats["completed"] += 1
+        return response
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        _stats["failed"] += 1
+        print(f"⏱️ Gemini call timed out after {timeout or LLM_TIMEOUT_SECONDS}s")
+        raise
+    except BaseException:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+        semaphore.release()
+
+
+async def generate_stream(prompt: str, config: Optional[genai.types.GenerationConfig] = None,
+                          timeout: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Stream one completion as text chunks while holding a concurrency slot
+    The timeout applies to the first chunk and to every gap between chunks
+    """
+    model = get_model()
+    semaphore = _get_semaphore()
+    timeout = timeout or LLM_TIMEOUT_SECONDS
+
+    _stats["waiting"] += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _stats["waiting"] -= 1
+
+    _stats["in_flight"] += 1
+    try:
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, generation_config=config, stream=True), timeout=timeout
+        )
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            if chunk.text:
+                yield chunk.text
+        _stats["completed"] += 1
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        _stats["failed"] += 1
+        print(f"⏱️ Gemini stream stalled for more than {timeout}s")
+        raise
+    except BaseException:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+        semaphore.release()
+
+
+def llm_stats() -> dict:
+    return {
+        "model": GEMINI_MODEL,
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "background_concurrency": LLM_BACKGROUND_CONCURRENCY,
+        "timeout_seconds": LLM_TIMEOUT_SECONDS,
+        **_stats
+    }
@@ -0,0 +1,55 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.utils.disk_cache import DiskCache
+
+# Bump whenever outline_extractor / pdf_pipeline output changes so stale entries are ignored
+EXTRACTOR_VERSION = "1"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+OUTLINE_CACHE_DIR = Path(os.getenv("OUTLINE_CACHE_DIR", "storage/cache/outlines"))
+OUTLINE_CACHE_MAX_BYTES = int(os.getenv("OUTLINE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_cache = DiskCache(OUTLINE_CACHE_DIR, OUTLINE_CACHE_MAX_BYTES)
+
+
+def _extraction_key(file_hash: str) -> str:
+    return f"{file_hash}-x{EXTRACTOR_VERSION}"
+
+
+def _vectors_key(file_hash: str) -> str:
+    model_tag = EMBEDDING_MODEL_NAME.replace(".", "_")
+    return f"{file_hash}-x{EXTRACTOR_VERSION}-{model_tag}"
+
+
+def get_cached_extraction(file_hash: str) -> Optional[dict]:
+    """Outline, section records and page count for a previously parsed PDF"""
+    return _cache.get_json(_extraction_key(file_hash))
+
+
+def put_cached_extraction(file_hash: str, extraction: dict):
+    _cache.put_json(_extraction_key(file_hash), {
+        "outline": extraction["outline"],
+        "embeddings": extraction["embeddings"],
+        "page_count": extraction.get("page_count", 0)
+    })
+
+
+class SectionVectorCache:
+    """Per-document section vectors, looked up by file hash while building a session index"""
+
+    def get(self, file_hash: str) -> Optional[np.ndarray]:
+        return _cache.get_array(_vectors_key(file_hash))
+
+    def put(self, file_hash: str, vectors: np.ndarray):
+        _cache.put_array(_vectors_key(file_hash), vectors)
+
+
+SECTION_VECTOR_CACHE = SectionVectorCache()
+
+
+def outline_cache_stats() -> dict:
+    return {"extractor_version": EXTRACTOR_VERSION, **_cache.stats()}
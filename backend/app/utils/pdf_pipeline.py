@@ -0,0 +1,83 @@
+import os
+import time
+
+import fitz
+
+from app.models.outline_extractor import ProperPDFExtractor
+
+# Runs inside the ingest process pool: keep this module free of model/LLM imports
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def process_pdf_document(content: bytes) -> dict:
+    """
+    Single-parse ingest stage for one PDF
+    Opens the document once and derives the outline and section records from it;
+    section vectors are batch-encoded per session when the retrieval index is built
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    doc = fitz.open(stream=content, filetype="pdf")
+    timings["open_ms"] = _elapsed_ms(start)
+
+    try:
+        start = time.perf_counter()
+        outline = ProperPDFExtractor().extract_outline(doc)
+        page_count = doc.page_count
+        timings["outline_ms"] = _elapsed_ms(start)
+    finally:
+        doc.close()
+
+    start = time.perf_counter()
+    embeddings = collect_section_records(outline)
+    timings["sections_ms"] = _elapsed_ms(start)
+
+    return {
+        "outline": outline,
+        "embeddings": embeddings,
+        "page_count": page_count,
+        "timings": timings
+    }
+
+
+def collect_section_records(outline: dict) -> dict:
+    """Collect section records for a document; vectors live in the session index matrix"""
+    embeddings = {}
+
+    for idx, section in enumerate(outline.get("outline", [])):
+        section_text = section.get("text", "")
+        if section_text:
+            embedding_id = f"section_{idx}"
+            embeddings[embedding_id] = {
+                "text": section_text,
+                "page": section.get("page", 0),
+                "level": section.get("level", 1)
+            }
+
+    return embeddings
+
+
+def extract_full_document_with_structure(pdf_input):
+    """Extract full document - handles both file path and bytes (full text, page count, title-like lines)"""
+    if isinstance(pdf_input, (str, os.PathLike)):
+        doc = fitz.open(pdf_input)
+    else:
+        doc = fitz.open(stream=pdf_input, filetype="pdf")
+    
+    full_text = ""
+    potential_titles = []
+    for page in doc:
+        text = page.get_text()
+        full_text += text + "\n"
+        lines = text.split("\n")[:10]
+        for line in lines:
+            if 10 < len(line) < 100 and line[0].isupper() and not line.lower().startswith("page") and len(line.split()) > 2:
+                potential_titles.append(line.strip())
+    
+    page_count = len(doc)
+    doc.close()
+    return full_text.strip(), page_count, potential_titles
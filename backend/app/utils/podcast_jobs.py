@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+from uuid import uuid4
+
+from app.utils.executors import run_in_thread
+
+# Job records live in SQLite so a status poll can land on any API worker;
+# the job itself runs on the worker that accepted it
+PODCAST_JOBS_DB_PATH = Path(os.getenv("PODCAST_JOBS_DB", "storage/jobs.sqlite3"))
+PODCAST_JOB_WORKERS = int(os.getenv("PODCAST_JOB_WORKERS", "2"))  # concurrent jobs per API worker
+PODCAST_JOB_QUEUE_LIMIT = int(os.getenv("PODCAST_JOB_QUEUE_LIMIT", "100"))
+# A queued/running job not updated for this long belonged to a worker that died or restarted
+PODCAST_JOB_STALE_SECONDS = float(os.getenv("PODCAST_JOB_STALE_SECONDS", "900"))
+PODCAST_JOB_TTL_SECONDS = float(os.getenv("PODCAST_JOB_TTL_SECONDS", str(24 * 60 * 60)))
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+class JobQueueFull(Exception):
+    """Raised by submit when PODCAST_JOB_QUEUE_LIMIT jobs are already waiting on this worker"""
+
+
+@contextmanager
+def _connect():
+    global _schema_ready
+    PODCAST_JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(PODCAST_JOBS_DB_PATH, timeout=30, isolation_level=None)
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                conn.executescript("""
+                    PRAGMA journal_mode=WAL;
+                    CREATE TABLE IF NOT EXISTS podcast_jobs (
+                        job_id TEXT PRIMARY KEY,
+                        session_id TEXT NOT NULL,
+                        analysis_id TEXT,
+                        status TEXT NOT NULL,
+                        record TEXT NOT NULL,
+                        updated_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS podcast_jobs_session ON podcast_jobs(session_id);
+                """)
+                # Job tables written before jobs were linked to analyses lack analysis_id
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(podcast_jobs)")}
+                if "analysis_id" not in columns:
+                    conn.execute("ALTER TABLE podcast_jobs ADD COLUMN analysis_id TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS podcast_jobs_analysis ON podcast_jobs(analysis_id)")
+                _schema_ready = True
+        yield conn
+    finally:
+        conn.close()
+
+
+def create_job(session_id: str, stages: List[str], details: Optional[dict] = None,
+               analysis_id: Optional[str] = None) -> dict:
+    """Record a queued job with every stage pending (analysis_id links a job to the analysis it narrates)"""
+    job = {
+        "job_id": str(uuid4()),
+        "session_id": session_id,
+        "analysis_id": analysis_id,
+        "status": "queued",
+        "stages": {stage: {"status": "pending"} for stage in stages},
+        "progress": 0.0,
+        "result": None,
+        "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+        **(details or {})
+    }
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO podcast_jobs (job_id, session_id, analysis_id, status, record, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job["job_id"], session_id, analysis_id, job["status"], json.dumps(job), time.time())
+        )
+    return job
+
+
+def _update(job_id: str, change: Callable[[dict], Optional[bool]]) -> Optional[dict]:
+    """Read-modify-write one job record in a single write transaction (change returning False skips the write)"""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT record FROM podcast_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            job = json.loads(row[0])
+            if change(job) is False:
+                conn.execute("ROLLBACK")
+                return job
+            stages = job["stages"].values()
+            job["progress"] = round(sum(
+                1.0 if stage["status"] == "done" else stage.get("progress", 0.0) for stage in stages
+            ) / max(len(stages), 1), 3)
+            conn.execute(
+                "UPDATE podcast_jobs SET status = ?, record = ?, updated_at = ? WHERE job_id = ?",
+                (job["status"], json.dumps(job), time.time(), job_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return job
+
+
+def update_stage(job_id: str, stage: str, status: str, **fields) -> Optional[dict]:
+    """
+    Move a stage to status ("running", "done" or "failed") or report its progress (0..1) while running
+    Stage start and duration are recorded; the job itself becomes "running" with its first stage
+    """
+    def change(job: dict):
+        record = job["stages"].setdefault(stage, {})
+        now = time.time()
+        if status == "running" and record.get("status") != "running":
+            record["started_at"] = now
+        if status in ("done", "failed") and "started_at" in record:
+            record["ms"] = round((now - record["started_at"]) * 1000, 2)
+        if status == "done":
+            record.pop("progress", None)
+        record.update(fields, status=status)
+        if job["status"] == "queued":
+            job["status"] = "running"
+    return _update(job_id, change)
+
+
+def finish_job(job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+    """Mark the job completed (with its result) or failed (with the error)"""
+    def change(job: dict):
+        job.update(status=status, result=result, error=error, finished_at=datetime.utcnow().isoformat())
+        for record in job["stages"].values():
+            if status == "failed" and record["status"] in ("pending", "running"):
+                record["status"] = "skipped" if record["status"] == "pending" else "failed"
+    return _update(job_id, change)
+
+
+def _job_from_row(row) -> Optional[dict]:
+    if row is None:
+        return None
+    job = json.loads(row[0])
+    if job["status"] in ("queued", "running") and time.time() - row[1] > PODCAST_JOB_STALE_SECONDS:
+        job.update(status="failed", error="Job interrupted (worker restarted)")
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with _connect() as conn:
+        return _job_from_row(conn.execute(
+            "SELECT record, updated_at FROM podcast_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone())
+
+
+def find_analysis_job(session_id: str, analysis_id: str) -> Optional[dict]:
+    """Latest job started for this analysis of this session, if any"""
+    with _connect() as conn:
+        return _job_from_row(conn.execute(
+            "SELECT record, updated_at FROM podcast_jobs WHERE analysis_id = ? AND session_id = ? "
+            "ORDER BY updated_at DESC LIMIT 1",
+            (analysis_id, session_id)
+        ).fetchone())
+
+
+def _transition(job_id: str, from_status: str, change: Callable[[dict], None]) -> bool:
+    """Apply change only if the job is still in from_status (atomic across API workers)"""
+    applied = []
+
+    def guarded(job: dict):
+        if job["status"] != from_status:
+            return False
+        change(job)
+        applied.append(True)
+    _update(job_id, guarded)
+    return bool(applied)
+
+
+def claim_job(job_id: str) -> bool:
+    """Move a queued job to running; False if it was withdrawn (or claimed) meanwhile"""
+    return _transition(job_id, "queued", lambda job: job.update(status="running"))
+
+
+def withdraw_queued_job(job_id: str, reason: str) -> bool:
+    """Fail a job that hasn't started yet, so its worker skips it; False if it already started"""
+    def change(job: dict):
+        job.update(status="failed", error=reason, finished_at=datetime.utcnow().isoformat())
+        for record in job["stages"].values():
+            record["status"] = "skipped"
+    return _transition(job_id, "queued", change)
+
+
+def remove_session_jobs(session_id: str) -> int:
+    with _connect() as conn:
+        return conn.execute("DELETE FROM podcast_jobs WHERE session_id = ?", (session_id,)).rowcount
+
+
+def prune_jobs() -> int:
+    """Drop job records older than PODCAST_JOB_TTL_SECONDS"""
+    with _connect() as conn:
+        return conn.execute(
+            "DELETE FROM podcast_jobs WHERE updated_at < ?", (time.time() - PODCAST_JOB_TTL_SECONDS,)
+        ).rowcount
+
+
+class PodcastJobQueue:
+    """
+    Bounded in-process queue drained by PODCAST_JOB_WORKERS asyncio workers
+    run(job_id, *args) performs the stages and must call finish_job; a crash marks the job failed
+    """
+
+    def __init__(self, name: str, workers: int = PODCAST_JOB_WORKERS, limit: int = PODCAST_JOB_QUEUE_LIMIT):
+        self.name = name
+        self.workers = workers
+        self.limit = limit
+        self._queue = None
+        self._tasks = []
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "skipped": 0, "running": 0}
+
+    def _start(self):
+        # Created on first submit, inside the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.limit)
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+            print(f"🎙️ {self.name} workers started ({self.workers})")
+
+    def submit(self, job_id: str, run: Callable[..., Awaitable[None]], *args):
+        self._start()
+        try:
+            self._queue.put_nowait((job_id, run, args))
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"{self.limit} {self.name} jobs already queued")
+        self._stats["submitted"] += 1
+
+    async def _worker(self):
+        while True:
+            job_id, run, args = await self._queue.get()
+            try:
+                claimed = await run_in_thread("storage", claim_job, job_id)
+            except Exception as e:
+                print(f"Could not claim podcast job {job_id}: {e}")
+                claimed = False
+            if not claimed:
+                self._stats["skipped"] += 1
+                self._queue.task_done()
+                continue
+            self._stats["running"] += 1
+            try:
+                await run(job_id, *args)
+                self._stats["completed"] += 1
+            except asyncio.CancelledError:
+                self._stats["failed"] += 1
+                finish_job(job_id, "failed", error="Job cancelled (server shutting down)")
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                print(f"Podcast job {job_id} failed: {e}")
+                await run_in_thread("storage", finish_job, job_id, "failed", None, str(e))
+            finally:
+                self._stats["running"] -= 1
+                self._queue.task_done()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_limit": self.limit,
+            **self._stats
+        }
@@ -0,0 +1,149 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} circuit open")
+        self.provider = provider
+
+
+class InvalidResponseError(Exception):
+    """The provider answered but the result was unusable: retried without counting against the breaker"""
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)]"""
+    base = RETRY_BASE_DELAY if base is None else base
+    cap = RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker: after failure_threshold consecutive failures the circuit opens and calls
+    fail fast for reset_seconds; then one probe call is let through (half-open) to test recovery
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None  # monotonic start of the half-open probe, if one is running
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_started = None
+            # A probe that never reported back (e.g. cancelled) stops blocking after reset_seconds
+            if self.state == "half_open" and (
+                self._probe_started is None or now - self._probe_started >= self.reset_seconds
+            ):
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"✅ {self.name} circuit closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"⚡ {self.name} circuit opened after {self.consecutive_failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_started = None
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+# provider -> outcome counts: success, retry, failure, short_circuit, fallback
+_outcomes: Dict[str, Counter] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(provider)
+    return _breakers[provider]
+
+
+def record_outcome(provider: str, outcome: str):
+    _outcomes.setdefault(provider, Counter())[outcome] += 1
+
+
+async def call_with_retries(provider: str, fn: Callable[[], Awaitable[T]], attempts: int = 3) -> T:
+    """
+    Call fn() through the provider's breaker, retrying failures with jittered exponential backoff
+    Raises CircuitOpenError when the breaker refuses the call, or the last error once attempts run out
+    """
+    breaker = get_breaker(provider)
+    for attempt in range(attempts):
+        if not breaker.allow():
+            record_outcome(provider, "short_circuit")
+            raise CircuitOpenError(provider)
+        try:
+            result = await fn()
+        except Exception as e:
+            if isinstance(e, InvalidResponseError):
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            if attempt == attempts - 1:
+                record_outcome(provider, "failure")
+                raise
+            delay = backoff_delay(attempt)
+            record_outcome(provider, "retry")
+            print(f"{provider} call failed (attempt {attempt + 1}/{attempts}): {e}; retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        record_outcome(provider, "success")
+        return result
+
+
+def resilience_stats() -> dict:
+    providers = set(_breakers) | set(_outcomes)
+    return {
+        provider: {
+            "breaker": get_breaker(provider).stats(),
+            "outcomes": dict(_outcomes.get(provider, {}))
+        }
+        for provider in sorted(providers)
+    }
@@ -0,0 +1,427 @@
+import os
+import time
+import pickle
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+# Same weighting and cut-off the per-pair scorer used, so scores stay comparable
+TFIDF_WEIGHT = 0.7
+KEYWORD_WEIGHT = 0.3
+MIN_COMBINED_SCORE = 0.1
+
+TFIDF_MAX_FEATURES = int(os.getenv("RETRIEVAL_TFIDF_MAX_FEATURES", "50000"))
+EMBED_BATCH_SIZE = int(os.getenv("RETRIEVAL_EMBED_BATCH_SIZE", "64"))
+
+RETRIEVAL_MODES = ("tfidf", "dense")
+
+# Indexes are written once per (session, version) and memory-mapped read-only by every API worker
+INDEX_DIR = Path(os.getenv("RETRIEVAL_INDEX_DIR", "storage/indexes"))
+INDEX_FORMAT_VERSION = "1"  # bump when the on-disk layout or scoring inputs change
+INDEX_MEMORY_LIMIT = int(os.getenv("RETRIEVAL_INDEX_MEMORY_LIMIT", "64"))  # open indexes per worker
+
+
+def _whitespace_tokens(text: str) -> List[str]:
+    """Tokenize exactly like the keyword-overlap check: lowercase, split on whitespace"""
+    return text.lower().split()
+
+
+def encode_texts(texts: List[str]) -> Optional[np.ndarray]:
+    """Batch-encode texts with the shared SentenceTransformer into a float32 matrix of unit rows"""
+    # Imported lazily so processes that only parse PDFs never load the model
+    from app.models.persona_analyzer import model as sentence_model
+
+    if sentence_model is None or not texts:
+        return None
+
+    vectors = sentence_model.encode(
+        texts,
+        batch_size=EMBED_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+class SessionRetrievalIndex:
+    """Sparse section index over all prior documents of a session, fitted once at ingest"""
+
+    def __init__(self, sections: List[dict], tfidf_vectorizer, tfidf_matrix, keyword_vectorizer, keyword_matrix,
+                 dense_matrix: Optional[np.ndarray] = None, timings: Optional[dict] = None):
+        self.sections = sections
+        self.tfidf_vectorizer = tfidf_vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.keyword_vectorizer = keyword_vectorizer
+        self.keyword_matrix = keyword_matrix
+        # (n_sections, dim) float32, rows L2-normalised - None if the model is unavailable
+        self.dense_matrix = dense_matrix
+        # Build-stage durations in milliseconds
+        self.timings = timings or {}
+
+    @classmethod
+    def build(cls, prior_docs: List[dict], vector_cache=None) -> "SessionRetrievalIndex":
+        """
+        Fit one TF-IDF vectorizer and one binary keyword matrix over every section
+        vector_cache (get/put by file hash) lets repeat uploads skip re-encoding their sections
+        """
+        sections = []
+        doc_rows = []  # (file_hash, first_row, end_row) per document with sections
+        for doc_idx, doc in enumerate(prior_docs):
+            doc_filename = doc.get("original_filename", f"Document_{doc_idx}")
+            doc_unique_id = doc.get("unique_id", f"doc_{doc_idx}")
+            first_row = len(sections)
+
+            for section_idx, section in enumerate(doc.get("outline", {}).get("outline", [])):
+                section_text = section.get("text", "")
+                if not section_text.strip():
+                    continue
+                sections.append({
+                    "document_name": doc_filename,
+                    "document_id": doc_unique_id,
+                    "file_hash": doc.get("file_hash"),
+                    "text": section_text,
+                    "page": section.get("page", 1),
+                    "level": section.get("level", 1),
+                    "section_index": section_idx
+                })
+
+            if len(sections) > first_row:
+                doc_rows.append((doc.get("file_hash"), first_row, len(sections)))
+
+        if not sections:
+            return cls(sections, None, None, None, None)
+
+        texts = [section["text"].lower() for section in sections]
+        timings = {}
+
+        start = time.perf_counter()
+        tfidf_vectorizer = TfidfVectorizer(stop_words='english', max_features=TFIDF_MAX_FEATURES)
+        try:
+            tfidf_matrix = tfidf_vectorizer.fit_transform(texts).tocsr()
+        except ValueError as e:
+            # Every section was stop words only - keyword overlap still works
+            print(f"TF-IDF index skipped: {e}")
+            tfidf_vectorizer, tfidf_matrix = None, None
+        timings["tfidf_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        start = time.perf_counter()
+        keyword_vectorizer = CountVectorizer(analyzer=_whitespace_tokens, binary=True)
+        keyword_matrix = keyword_vectorizer.fit_transform(texts).tocsr()
+        timings["keyword_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        start = time.perf_counter()
+        try:
+            dense_matrix = cls._encode_sections(sections, doc_rows, vector_cache, timings)
+        except Exception as e:
+            print(f"Dense embedding failed, dense retrieval disabled: {e}")
+            dense_matrix = None
+        timings["embed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        print(f"🗂️ Built session index: {len(sections)} sections, "
+              f"{len(tfidf_vectorizer.vocabulary_) if tfidf_vectorizer else 0} TF-IDF terms, "
+              f"dense={'yes' if dense_matrix is not None else 'no'}")
+
+        return cls(sections, tfidf_vectorizer, tfidf_matrix, keyword_vectorizer, keyword_matrix, dense_matrix, timings)
+
+    @staticmethod
+    def _encode_sections(sections: List[dict], doc_rows: list, vector_cache, timings: dict) -> Optional[np.ndarray]:
+        """Encode section texts in one batch, reusing cached per-document vectors where available"""
+        texts = [section["text"] for section in sections]
+        if vector_cache is None:
+            return encode_texts(texts)
+
+        blocks = [None] * len(doc_rows)
+        missing = []
+        for i, (file_hash, first_row, end_row) in enumerate(doc_rows):
+            cached = vector_cache.get(file_hash) if file_hash else None
+            if cached is not None and cached.shape[0] == end_row - first_row:
+                blocks[i] = cached
+            else:
+                missing.append(i)
+        timings["vector_cache_hits"] = len(doc_rows) - len(missing)
+
+        if missing:
+            encoded = encode_texts([
+                text for i in missing for text in texts[doc_rows[i][1]:doc_rows[i][2]]
+            ])
+            if encoded is None:
+                return None
+            offset = 0
+            for i in missing:
+                file_hash, first_row, end_row = doc_rows[i]
+                blocks[i] = encoded[offset:offset + end_row - first_row]
+                offset += end_row - first_row
+                if file_hash:
+                    vector_cache.put(file_hash, blocks[i])
+
+        return np.ascontiguousarray(np.vstack(blocks), dtype=np.float32)
+
+    def save(self, directory: Path):
+        """Write matrices as .npy arrays (memory-mappable) and the vectorizers + section records as a pickle"""
+        directory.mkdir(parents=True, exist_ok=True)
+        shapes = {}
+        for name, matrix in (("tfidf", self.tfidf_matrix), ("keyword", self.keyword_matrix)):
+            if matrix is None:
+                continue
+            matrix.sort_indices()
+            for part in ("data", "indices", "indptr"):
+                np.save(directory / f"{name}_{part}.npy", getattr(matrix, part), allow_pickle=False)
+            shapes[name] = matrix.shape
+        if self.dense_matrix is not None:
+            np.save(directory / "dense.npy", self.dense_matrix, allow_pickle=False)
+
+        with open(directory / "meta.pkl", "wb") as f:
+            pickle.dump({
+                "sections": self.sections,
+                "tfidf_vectorizer": self.tfidf_vectorizer,
+                "keyword_vectorizer": self.keyword_vectorizer,
+                "shapes": shapes,
+                "timings": self.timings
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, directory: Path) -> "SessionRetrievalIndex":
+        """Open a saved index; matrix arrays stay on disk and are shared through the page cache"""
+        with open(directory / "meta.pkl", "rb") as f:
+            meta = pickle.load(f)
+
+        def load_matrix(name):
+            shape = meta["shapes"].get(name)
+            if shape is None:
+                return None
+            data, indices, indptr = (
+                np.load(directory / f"{name}_{part}.npy", mmap_mode="r") for part in ("data", "indices", "indptr")
+            )
+            matrix = csr_matrix((data, indices, indptr), shape=shape, copy=False)
+            # Saved sorted; stops scipy from trying to sort the read-only arrays in place
+            matrix.has_sorted_indices = True
+            return matrix
+
+        dense_path = directory / "dense.npy"
+        dense_matrix = np.load(dense_path, mmap_mode="r") if dense_path.exists() else None
+        return cls(meta["sections"], meta["tfidf_vectorizer"], load_matrix("tfidf"),
+                   meta["keyword_vectorizer"], load_matrix("keyword"), dense_matrix, meta["timings"])
+
+    @property
+    def size(self) -> int:
+        return len(self.sections)
+
+    def stats(self) -> dict:
+        return {
+            "sections": self.size,
+            "tfidf_terms": len(self.tfidf_vectorizer.vocabulary_) if self.tfidf_vectorizer else 0,
+            "keyword_terms": len(self.keyword_vectorizer.vocabulary_) if self.keyword_vectorizer else 0,
+            "dense_dim": int(self.dense_matrix.shape[1]) if self.dense_matrix is not None else 0
+        }
+
+    @property
+    def has_dense(self) -> bool:
+        return self.dense_matrix is not None
+
+    def keyword_overlap(self, selection_text: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Share of the selection's distinct words found in each section (or only in the given rows)"""
+        keyword_matrix = self.keyword_matrix if rows is None else self.keyword_matrix[rows]
+        keyword_overlap = np.zeros(keyword_matrix.shape[0], dtype=np.float64)
+        selection_words = set(_whitespace_tokens(selection_text))
+        query_words = self.keyword_vectorizer.transform([selection_text])
+        if query_words.nnz:
+            shared = (keyword_matrix @ query_words.T).toarray().ravel()
+            keyword_overlap = shared / max(len(selection_words), 1)
+        return keyword_overlap
+
+    def score(self, selection_text: str, mode: str = "tfidf", rows: Optional[np.ndarray] = None):
+        """
+        Return (combined, similarity, keyword_overlap) score arrays for every section,
+        or only for the given candidate rows (arrays then follow the order of rows)
+        """
+        n = self.size if rows is None else len(rows)
+        similarity = np.zeros(n, dtype=np.float64)
+
+        if n == 0 or not selection_text.strip():
+            return similarity, similarity, similarity
+
+        if mode == "dense" and self.dense_matrix is not None:
+            # One (n, dim) x (dim,) product; negative cosines carry no relevance
+            query = encode_texts([selection_text])
+            dense_matrix = self.dense_matrix if rows is None else self.dense_matrix[rows]
+            similarity = np.clip(dense_matrix @ query[0], 0.0, 1.0).astype(np.float64)
+        elif self.tfidf_vectorizer is not None:
+            # Vectorizers lowercase on their own; rows are L2-normalised, so the dot product is the cosine
+            query = self.tfidf_vectorizer.transform([selection_text])
+            if query.nnz:
+                tfidf_matrix = self.tfidf_matrix if rows is None else self.tfidf_matrix[rows]
+                similarity = (tfidf_matrix @ query.T).toarray().ravel()
+
+        keyword_overlap = self.keyword_overlap(selection_text, rows)
+        combined = (similarity * TFIDF_WEIGHT) + (keyword_overlap * KEYWORD_WEIGHT)
+        return combined, similarity, keyword_overlap
+
+    def candidate_rows(self, texts: List[str], per_text: int, mode: str = "tfidf") -> List[np.ndarray]:
+        """
+        Best-scoring rows for several queries at once (e.g. every heading of the reading document):
+        one sparse (or dense) product for all queries, then the top per_text rows of each column
+        """
+        n = self.size
+        if n == 0 or not texts:
+            return [np.empty(0, dtype=np.int64) for _ in texts]
+
+        similarity = np.zeros((n, len(texts)), dtype=np.float64)
+        if mode == "dense" and self.dense_matrix is not None:
+            queries = encode_texts(texts)
+            similarity = np.clip(self.dense_matrix @ queries.T, 0.0, 1.0).astype(np.float64)
+        elif self.tfidf_vectorizer is not None:
+            similarity = (self.tfidf_matrix @ self.tfidf_vectorizer.transform(texts).T).toarray()
+
+        shared = (self.keyword_matrix @ self.keyword_vectorizer.transform(texts).T).toarray()
+        word_counts = np.array([max(len(set(_whitespace_tokens(text))), 1) for text in texts])
+        combined = (similarity * TFIDF_WEIGHT) + ((shared / word_counts) * KEYWORD_WEIGHT)
+
+        per_text = min(per_text, n)
+        candidates = []
+        for column in combined.T:
+            best = np.argpartition(-column, per_text - 1)[:per_text]
+            candidates.append(np.sort(best[column[best] > 0]))
+        return candidates
+
+    def resolve_mode(self, mode: str) -> str:
+        """Fall back to TF-IDF when dense vectors were not built"""
+        if mode == "dense" and not self.has_dense:
+            print("Dense retrieval unavailable for this session, using TF-IDF")
+            return "tfidf"
+        return mode if mode in RETRIEVAL_MODES else "tfidf"
+
+    def search(self, selection_text: str, top_k: int = 15, mode: str = "tfidf",
+               rows: Optional[np.ndarray] = None) -> List[dict]:
+        """
+        Score every section in one pass and pick the top_k above the cut-off
+        With rows (sorted candidate row ids) only those sections are scored
+        """
+        combined, _, keyword_overlap = self.score(selection_text, self.resolve_mode(mode), rows)
+        return self.top_snippets(combined, keyword_overlap, top_k, rows)
+
+    def top_snippets(self, combined, keyword_overlap, top_k: int, rows: Optional[np.ndarray] = None) -> List[dict]:
+        """Select the best rows with argpartition and format them as snippets"""
+        if top_k <= 0:
+            return []
+        candidates = np.flatnonzero(combined > MIN_COMBINED_SCORE)
+        if candidates.size > top_k:
+            best = np.argpartition(-combined[candidates], top_k - 1)[:top_k]
+            candidates = candidates[best]
+        # Stable sort keeps document order for equal scores, like list.sort did
+        candidates = candidates[np.argsort(-combined[candidates], kind="stable")]
+        return [
+            self.snippet(int(row if rows is None else rows[row]), float(combined[row]), float(keyword_overlap[row]))
+            for row in candidates
+        ]
+
+    def snippet(self, row: int, score: float, keyword_overlap: float) -> dict:
+        section = self.sections[row]
+        doc_unique_id = section["document_id"]
+        return {
+            "document_name": section["document_name"],
+            "document_id": doc_unique_id,    # CRITICAL: Use unique_id
+            "unique_id": doc_unique_id,      # CRITICAL: For PDF preview
+            "file_hash": section.get("file_hash"),  # same PDF content across uploads (None in older saved indexes)
+            "section_text": section["text"],
+            "page": section["page"],
+            "section_level": section["level"],
+            "similarity_score": score,
+            "keyword_overlap": keyword_overlap,
+            "deep_link": f"doc_{doc_unique_id}_page_{section['page']}",
+            "snippet_length": len(section["text"]),
+            "section_index": section["section_index"]
+        }
+
+
+# Per-worker LRU of open indexes: session_id -> (version, index)
+_SESSION_INDEXES = OrderedDict()
+_SESSION_INDEXES_LOCK = threading.Lock()
+
+
+def index_version(prior_docs: List[dict]) -> str:
+    """Identify the document set an index was built from, so workers can spot stale copies"""
+    digest = hashlib.sha1(INDEX_FORMAT_VERSION.encode())
+    for doc in prior_docs:
+        digest.update(f"{doc.get('unique_id')}:{doc.get('file_hash')}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def _session_index_dir(session_id: str) -> Path:
+    # Session ids come from clients - hash them rather than using them as path components
+    return INDEX_DIR / hashlib.sha1(session_id.encode()).hexdigest()
+
+
+def _remember(session_id: str, version: str, index: SessionRetrievalIndex):
+    with _SESSION_INDEXES_LOCK:
+        _SESSION_INDEXES[session_id] = (version, index)
+        _SESSION_INDEXES.move_to_end(session_id)
+        while len(_SESSION_INDEXES) > INDEX_MEMORY_LIMIT:
+            _SESSION_INDEXES.popitem(last=False)
+
+
+def persist_session_index(session_id: str, version: str, index: SessionRetrievalIndex):
+    """Write the index to <session dir>/<version> atomically and drop older versions"""
+    session_dir = _session_index_dir(session_id)
+    final_dir = session_dir / version
+    tmp_dir = session_dir / f".{version}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        index.save(tmp_dir)
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        if not final_dir.exists():
+            raise
+        # Another worker already published this version
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for stale in session_dir.iterdir():
+        if stale.name != version and not stale.name.startswith("."):
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+def build_session_index(session_id: str, prior_docs: List[dict], vector_cache=None) -> SessionRetrievalIndex:
+    """Fit the session index, publish it for the other workers and keep it open here"""
+    index = SessionRetrievalIndex.build(prior_docs, vector_cache)
+    version = index_version(prior_docs)
+    try:
+        persist_session_index(session_id, version, index)
+    except OSError as e:
+        print(f"Could not persist retrieval index for {session_id}, other workers will rebuild it: {e}")
+    _remember(session_id, version, index)
+    return index
+
+
+def get_session_index(session_id: str, prior_docs: List[dict]) -> Optional[SessionRetrievalIndex]:
+    """Return the index matching prior_docs from this worker's cache or disk, or None if it must be rebuilt"""
+    version = index_version(prior_docs)
+    with _SESSION_INDEXES_LOCK:
+        cached = _SESSION_INDEXES.get(session_id)
+        if cached is not None and cached[0] == version:
+            _SESSION_INDEXES.move_to_end(session_id)
+            return cached[1]
+
+    directory = _session_index_dir(session_id) / version
+    if not directory.exists():
+        return None
+    try:
+        index = SessionRetrievalIndex.load(directory)
+    except Exception as e:
+        print(f"Saved retrieval index for {session_id} unreadable, rebuilding: {e}")
+        return None
+    _remember(session_id, version, index)
+    print(f"🗂️ Opened saved index for session {session_id} ({index.size} sections)")
+    return index
+
+
+def drop_session_index(session_id: str):
+    with _SESSION_INDEXES_LOCK:
+        _SESSION_INDEXES.pop(session_id, None)
+    shutil.rmtree(_session_index_dir(session_id), ignore_errors=True)
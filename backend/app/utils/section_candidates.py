@@ -0,0 +1,117 @@
+import os
+import time
+import bisect
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from app.utils.retrieval_index import SessionRetrievalIndex
+
+# Warm candidate sets (opt-in): after the reading document is set, every heading is run against the
+# session index in the background; selections on a page then only score that page's candidates.
+# This is an approximation - a section outside the candidates is never scored, so a selection that
+# strays from its headings can miss sections a full scan would rank in its top k (the full scan is
+# only the fallback when the candidates yield fewer than top k matches at all)
+PRECOMPUTE_SECTION_CANDIDATES = os.getenv("PRECOMPUTE_SECTION_CANDIDATES", "false").lower() == "true"
+CANDIDATES_PER_SECTION = int(os.getenv("SECTION_CANDIDATES_PER_SECTION", "200"))
+# Below this many prior sections a full scan is as cheap as a candidate lookup
+MIN_INDEX_SIZE = int(os.getenv("SECTION_CANDIDATES_MIN_INDEX_SIZE", "2000"))
+CANDIDATE_MEMORY_LIMIT = int(os.getenv("SECTION_CANDIDATES_MEMORY_LIMIT", "64"))  # sessions per worker
+
+# Per-worker LRU: session_id -> warm entry (see precompute_section_candidates)
+_WARM = OrderedDict()
+_WARM_LOCK = threading.Lock()
+_stats = {"built": 0, "hits": 0, "misses": 0, "fallbacks": 0}
+
+
+def _heading_text(section: dict) -> str:
+    return section.get("text", "").strip()
+
+
+def precompute_section_candidates(session_id: str, current_doc: dict, index: SessionRetrievalIndex,
+                                  index_version: str, modes: List[str]) -> Optional[dict]:
+    """
+    Retrieve candidates for every heading of the current document and keep them per page and section
+    Cached against (index version, current document id) so a new upload or re-ingest invalidates it
+    """
+    headings = [
+        {"section_index": i, "page": section.get("page", 0), "text": _heading_text(section)}
+        for i, section in enumerate(current_doc.get("outline", {}).get("outline", []))
+        if _heading_text(section)
+    ]
+    if not headings or index.size < MIN_INDEX_SIZE:
+        return None
+
+    start = time.perf_counter()
+    headings.sort(key=lambda h: (h["page"], h["section_index"]))
+    texts = [h["text"] for h in headings]
+    rows = {mode: index.candidate_rows(texts, CANDIDATES_PER_SECTION, mode) for mode in modes}
+    sections = [
+        {**heading, "rows": {mode: rows[mode][i] for mode in modes}}
+        for i, heading in enumerate(headings)
+    ]
+    entry = {
+        "key": (index_version, current_doc.get("unique_id")),
+        "sections": sections,
+        "pages": [section["page"] for section in sections],
+        "built_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+    with _WARM_LOCK:
+        _WARM[session_id] = entry
+        _WARM.move_to_end(session_id)
+        while len(_WARM) > CANDIDATE_MEMORY_LIMIT:
+            _WARM.popitem(last=False)
+    _stats["built"] += 1
+    print(f"🔥 Warmed {len(sections)} section candidate sets for session {session_id} in {entry['built_ms']}ms")
+    return entry
+
+
+def sections_for_page(entry: dict, page_number: int) -> List[dict]:
+    """Sections starting on the page plus the one already open at its top"""
+    pages = entry["pages"]
+    first = bisect.bisect_left(pages, page_number)
+    last = bisect.bisect_right(pages, page_number)
+    return entry["sections"][max(first - 1, 0):last]
+
+
+def get_page_candidates(session_id: str, index_version: str, current_doc_id: str,
+                        page_number: int, mode: str) -> Optional[np.ndarray]:
+    """Sorted candidate rows for a selection on page_number, or None when nothing warm applies"""
+    with _WARM_LOCK:
+        entry = _WARM.get(session_id)
+        if entry is not None:
+            _WARM.move_to_end(session_id)
+
+    if entry is None or entry["key"] != (index_version, current_doc_id):
+        _stats["misses"] += 1
+        return None
+
+    rows = [section["rows"][mode] for section in sections_for_page(entry, page_number) if mode in section["rows"]]
+    if not rows:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return np.unique(np.concatenate(rows))
+
+
+def record_fallback():
+    """The warm candidates had too few matches and the selection was scored against the whole index"""
+    _stats["fallbacks"] += 1
+
+
+def drop_section_candidates(session_id: str):
+    with _WARM_LOCK:
+        _WARM.pop(session_id, None)
+
+
+def section_candidate_stats() -> dict:
+    return {
+        "enabled": PRECOMPUTE_SECTION_CANDIDATES,
+        "sessions": len(_WARM),
+        "per_section": CANDIDATES_PER_SECTION,
+        "min_index_size": MIN_INDEX_SIZE,
+        **_stats
+    }
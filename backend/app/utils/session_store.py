@@ -0,0 +1,377 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "sqlite")  # "sqlite" or "memory"
+SESSION_STORE_PATH = Path(os.getenv("SESSION_STORE_PATH", "storage/sessions.sqlite3"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 60 * 60)))
+
+# Per-session list caps so long-lived sessions stay bounded
+SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "50"))
+SESSION_PODCAST_LIMIT = int(os.getenv("SESSION_PODCAST_LIMIT", "20"))
+
+# change(data) edits a session in place or returns its replacement (see SessionStore.update)
+SessionChange = Callable[[dict], Optional[dict]]
+
+# listener(session_id, data, reason) with reason in "deleted", "cleared", "expired", "evicted"
+RemovalListener = Callable[[str, dict, str], None]
+
+
+class SessionStore:
+    """
+    Dict-style session storage used by the routes
+    Backends bound the number of sessions (LRU) and drop sessions idle longer than the TTL;
+    removal listeners let other components release per-session resources
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._listeners: List[RemovalListener] = []
+
+    def add_removal_listener(self, listener: RemovalListener):
+        self._listeners.append(listener)
+
+    def _notify(self, removed: List[Tuple[str, dict]], reason: str):
+        for session_id, data in removed:
+            if reason in ("expired", "evicted"):
+                print(f"🗑️ Session {session_id} {reason}")
+            for listener in self._listeners:
+                try:
+                    listener(session_id, data, reason)
+                except Exception as e:
+                    print(f"Session removal listener failed for {session_id}: {e}")
+
+    # Backend operations
+    def get(self, session_id: str, default=None):
+        raise NotImplementedError
+
+    def set(self, session_id: str, data: dict):
+        raise NotImplementedError
+
+    def update(self, session_id: str, change: SessionChange, create: bool = False) -> Optional[dict]:
+        """
+        Atomically re-read the session, apply change and write the result back
+        Concurrent updates never overwrite each other (unlike get + set); returns the stored data,
+        or None if the session doesn't exist and create is False (change then isn't called)
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, dict]]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def prune(self):
+        """Drop expired sessions and enforce max_sessions"""
+        raise NotImplementedError
+
+    # Dict compatibility
+    def __getitem__(self, session_id: str) -> dict:
+        data = self.get(session_id)
+        if data is None:
+            raise KeyError(session_id)
+        return data
+
+    def __setitem__(self, session_id: str, data: dict):
+        self.set(session_id, data)
+
+    def __delitem__(self, session_id: str):
+        if not self.delete(session_id):
+            raise KeyError(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def values(self) -> Iterator[dict]:
+        return (data for _, data in self.items())
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU + TTL store; sessions are lost on restart"""
+
+    def __init__(self, max_sessions: int, ttl_seconds: float):
+        super().__init__(max_sessions, ttl_seconds)
+        self._sessions = OrderedDict()  # session_id -> (data, last_access)
+        self._lock = threading.RLock()
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - last_access > self.ttl_seconds
+
+    def get(self, session_id: str, default=None):
+        removed = []
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return default
+            data, last_access = entry
+            now = time.time()
+            if self._expired(last_access, now):
+                del self._sessions[session_id]
+                removed.append((session_id, data))
+            else:
+                self._sessions[session_id] = (data, now)
+                self._sessions.move_to_end(session_id)
+        if removed:
+            self._notify(removed, "expired")
+            return default
+        return data
+
+    def set(self, session_id: str, data: dict):
+        with self._lock:
+            self._sessions[session_id] = (data, time.time())
+            self._sessions.move_to_end(session_id)
+        self.prune()
+
+    def update(self, session_id: str, change: SessionChange, create: bool = False) -> Optional[dict]:
+        removed = []
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            now = time.time()
+            if entry is not None and self._expired(entry[1], now):
+                del self._sessions[session_id]
+                removed.append((session_id, entry[0]))
+                entry = None
+            if entry is None and not create:
+                data = None
+            else:
+                data = entry[0] if entry is not None else {}
+                replacement = change(data)
+                data = replacement if replacement is not None else data
+                self._sessions[session_id] = (data, now)
+                self._sessions.move_to_end(session_id)
+        self._notify(removed, "expired")
+        if data is not None:
+            self.prune()
+        return data
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        self._notify([(session_id, entry[0])], "deleted")
+        return True
+
+    def clear(self):
+        with self._lock:
+            removed = [(session_id, data) for session_id, (data, _) in self._sessions.items()]
+            self._sessions.clear()
+        self._notify(removed, "cleared")
+
+    def items(self):
+        with self._lock:
+            snapshot = [(session_id, data) for session_id, (data, _) in self._sessions.items()]
+        return iter(snapshot)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def prune(self):
+        expired, evicted = [], []
+        with self._lock:
+            now = time.time()
+            for session_id, (data, last_access) in list(self._sessions.items()):
+                if self._expired(last_access, now):
+                    del self._sessions[session_id]
+                    expired.append((session_id, data))
+            while self.max_sessions > 0 and len(self._sessions) > self.max_sessions:
+                session_id, (data, _) = self._sessions.popitem(last=False)
+                evicted.append((session_id, data))
+        self._notify(expired, "expired")
+        self._notify(evicted, "evicted")
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed LRU + TTL store; sessions survive restarts and are shared by local processes"""
+
+    def __init__(self, path: Path, max_sessions: int, ttl_seconds: float):
+        super().__init__(max_sessions, ttl_seconds)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _ClosingConnection(conn)
+
+    def get(self, session_id: str, default=None):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return default
+            data = pickle.loads(row[0])
+            if self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                expired = True
+            else:
+                conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+                expired = False
+        if expired:
+            self._notify([(session_id, data)], "expired")
+            return default
+        return data
+
+    def set(self, session_id: str, data: dict):
+        now = time.time()
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, data, last_access, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, "
+                "last_access = excluded.last_access, updated_at = excluded.updated_at",
+                (session_id, payload, now, now)
+            )
+        self.prune()
+
+    def update(self, session_id: str, change: SessionChange, create: bool = False) -> Optional[dict]:
+        now = time.time()
+        expired = []
+        with self._connect() as conn:
+            # The write lock is held from the read to the write, so no other update can slip in between
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            data = pickle.loads(row[0]) if row is not None else None
+            if data is not None and self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                expired.append((session_id, data))
+                data = None
+            if data is None and not create:
+                conn.execute("COMMIT")
+            else:
+                data = data if data is not None else {}
+                replacement = change(data)
+                data = replacement if replacement is not None else data
+                conn.execute(
+                    "INSERT INTO sessions (session_id, data, last_access, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, "
+                    "last_access = excluded.last_access, updated_at = excluded.updated_at",
+                    (session_id, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), now, now)
+                )
+                conn.execute("COMMIT")
+        self._notify(expired, "expired")
+        if data is not None:
+            self.prune()
+        return data
+
+    def delete(self, session_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._notify([(session_id, pickle.loads(row[0]))], "deleted")
+        return True
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT session_id, data FROM sessions").fetchall()
+            conn.execute("DELETE FROM sessions")
+            conn.execute("COMMIT")
+        self._notify([(session_id, pickle.loads(data)) for session_id, data in rows], "cleared")
+
+    def items(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT session_id, data FROM sessions ORDER BY last_access").fetchall()
+        return ((session_id, pickle.loads(data)) for session_id, data in rows)
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None and not (self.ttl_seconds > 0 and time.time() - row[0] > self.ttl_seconds)
+
+    def prune(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = []
+            if self.ttl_seconds > 0:
+                cutoff = time.time() - self.ttl_seconds
+                expired = conn.execute(
+                    "SELECT session_id, data FROM sessions WHERE last_access < ?", (cutoff,)
+                ).fetchall()
+                conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+
+            evicted = []
+            if self.max_sessions > 0:
+                overflow = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+                if overflow > 0:
+                    evicted = conn.execute(
+                        "SELECT session_id, data FROM sessions ORDER BY last_access LIMIT ?", (overflow,)
+                    ).fetchall()
+                    conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(row[0],) for row in evicted])
+            conn.execute("COMMIT")
+
+        self._notify([(session_id, pickle.loads(data)) for session_id, data in expired], "expired")
+        self._notify([(session_id, pickle.loads(data)) for session_id, data in evicted], "evicted")
+
+
+class _ClosingConnection:
+    """Use an sqlite3 connection as a context manager that closes it (sqlite3's own only commits)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """Build the configured session store"""
+    backend = (backend or SESSION_STORE_BACKEND).lower()
+    if backend == "memory":
+        if int(os.getenv("WEB_CONCURRENCY") or "1") > 1:
+            print("⚠️ Memory session store is per process - sessions will not be shared between API workers")
+        store = MemorySessionStore(SESSION_MAX_SESSIONS, SESSION_TTL_SECONDS)
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(SESSION_STORE_PATH, SESSION_MAX_SESSIONS, SESSION_TTL_SECONDS)
+    else:
+        raise ValueError(f"Unknown SESSION_STORE_BACKEND: {backend}")
+    print(f"🗄️ Session store: {type(store).__name__} (max {SESSION_MAX_SESSIONS} sessions, TTL {SESSION_TTL_SECONDS:.0f}s)")
+    return store
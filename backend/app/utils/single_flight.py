@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async calls: the first caller for a key starts the work,
+    later callers await the same task and get the same result (or exception).
+    The shared task is shielded from any one caller's cancellation and is only cancelled
+    once every caller waiting on it has gone away
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, dict] = {}
+        self._stats = {"started": 0, "coalesced": 0}
+
+    async def run(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            call = {"task": task, "waiters": 0}
+            self._calls[key] = call
+            task.add_done_callback(lambda _: self._forget(key, call))
+            self._stats["started"] += 1
+        else:
+            self._stats["coalesced"] += 1
+            print(f"🔗 {self.name}: joined in-flight call ({call['waiters']} already waiting)")
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                call["task"].cancel()
+
+    def _forget(self, key: Hashable, call: dict):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), **self._stats}
@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+from uuid import uuid4
+
+from openai import AzureOpenAI
+
+from app.utils.executors import run_in_thread
+from app.utils.resilience import call_with_retries
+
+# "azure" calls Azure OpenAI TTS; "local" is an offline stand-in that writes silent MP3 audio
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "azure").lower()
+# Scripts are split at sentence boundaries into chunks of at most this many characters
+# (Azure accepts up to 4096); chunks are synthesized concurrently within the "tts" stage limit
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "1200"))
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz frame header: 417-byte frames of 1152 samples (~26 ms)
+_SILENT_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+_FRAMES_PER_WORD = 15  # ~0.4 s per word at 150 words per minute
+
+
+def split_script(script: str, max_chars: int = TTS_CHUNK_CHARS) -> List[str]:
+    """Pack whole sentences into chunks of at most max_chars; an overlong sentence is split at spaces"""
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END_RE.split(script.strip()):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def strip_id3(data: bytes, keep_header: bool = False) -> bytes:
+    """
+    Drop the ID3v1 trailer and (unless keep_header) the ID3v2 header of one MP3 segment,
+    so concatenated segments don't carry tags in the middle of the stream
+    """
+    if data[-128:-125] == b"TAG":
+        data = data[:-128]
+    if not keep_header and data[:3] == b"ID3" and len(data) >= 10:
+        # Tag size is a 28-bit syncsafe integer; a footer (flag 0x10) adds another 10 bytes
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        size += 20 if data[5] & 0x10 else 10
+        data = data[size:]
+    return data
+
+
+class AzureTTSProvider:
+    name = "azure_tts"
+
+    def __init__(self):
+        settings = tts_settings()
+        self.deployment = settings["deployment"]
+        self.voice = settings["voice"]
+        self.client = AzureOpenAI(
+            api_key=os.getenv("AZURE_TTS_KEY"),
+            api_version=os.getenv("AZURE_TTS_API_VERSION", "2025-03-01-preview"),
+            azure_endpoint=os.getenv("AZURE_TTS_ENDPOINT"),
+            max_retries=0,  # retries and backoff come from call_with_retries
+        )
+
+    def synthesize(self, text: str) -> bytes:
+        response = self.client.audio.speech.create(
+            model=self.deployment,  # This must match your Azure deployment name
+            voice=self.voice,
+            input=text,
+            response_format="mp3",
+        )
+        return response.read()
+
+
+class LocalTTSProvider:
+    """Offline stand-in: silent MP3 audio as long as the text would take to read, tagged like a real response"""
+    name = "local_tts"
+    deployment = "local"
+    voice = "silent"
+
+    def synthesize(self, text: str) -> bytes:
+        frames = max(1, len(text.split()) * _FRAMES_PER_WORD)
+        return b"ID3\x04\x00\x00\x00\x00\x00\x00" + _SILENT_FRAME * frames
+
+
+_provider = None
+
+
+def tts_settings() -> dict:
+    """Provider name, deployment and voice in effect, without creating a client"""
+    if TTS_PROVIDER == "local":
+        return {"provider": LocalTTSProvider.name, "deployment": LocalTTSProvider.deployment,
+                "voice": LocalTTSProvider.voice}
+    return {
+        "provider": AzureTTSProvider.name,
+        "deployment": os.getenv("AZURE_TTS_DEPLOYMENT", "tts"),
+        "voice": os.getenv("AZURE_TTS_VOICE", "alloy")  # alloy is a safe default
+    }
+
+
+def get_tts_provider():
+    """Create the configured provider once; its client is shared by every chunk and request"""
+    global _provider
+    if _provider is None:
+        _provider = LocalTTSProvider() if TTS_PROVIDER == "local" else AzureTTSProvider()
+        print(f"Using {_provider.name} (deployment={_provider.deployment}, voice={_provider.voice})")
+    return _provider
+
+
+async def _synthesize_chunk(provider, index: int, text: str, stage: str) -> dict:
+    start = time.perf_counter()
+    audio = await call_with_retries(provider.name, lambda: run_in_thread(stage, provider.synthesize, text))
+    return {
+        "index": index,
+        "chars": len(text),
+        "bytes": len(audio),
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+        "audio": audio
+    }
+
+
+def _append(path: Path, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+async def synthesize_script(script: str, audio_path: Path,
+                            on_chunk: Optional[Callable[[int, int], Awaitable[None]]] = None,
+                            on_start: Optional[Callable[[], Awaitable[None]]] = None,
+                            background: bool = False) -> dict:
+    """
+    Synthesize the script chunk by chunk in parallel and stitch the segments into audio_path
+    Segments are appended in order as soon as each is ready (to a .part file renamed at the end);
+    if any chunk fails the others are cancelled and the error is raised
+    on_start() is awaited once the (empty) .part file exists, so readers can follow it from then on
+    on_chunk(written, total) is awaited after each segment is appended
+    background chunks run on the smaller "tts_background" stage instead of taking "tts" slots
+    Returns a report with per-chunk timings
+    """
+    provider = get_tts_provider()
+    chunks = split_script(script)
+    stage = "tts_background" if background else "tts"
+    if not chunks:
+        raise ValueError("Nothing to synthesize")
+
+    start = time.perf_counter()
+    # Unique per call, so concurrent syntheses of the same script never interleave their writes
+    part_path = audio_path.with_name(f"{audio_path.name}.{uuid4().hex[:12]}.part")
+    await run_in_thread("storage", part_path.touch)
+    tasks = []
+    timings = []
+    try:
+        if on_start is not None:
+            await on_start()
+        tasks = [asyncio.ensure_future(_synthesize_chunk(provider, i, text, stage)) for i, text in enumerate(chunks)]
+        for task in tasks:
+            result = await task
+            audio = strip_id3(result.pop("audio"), keep_header=result["index"] == 0)
+            await run_in_thread("storage", _append, part_path, audio)
+            timings.append(result)
+            if on_chunk is not None:
+                await on_chunk(len(timings), len(chunks))
+        os.replace(part_path, audio_path)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        part_path.unlink(missing_ok=True)
+        raise
+
+    total_ms = round((time.perf_counter() - start) * 1000, 2)
+    print(f"🔊 {provider.name}: {len(chunks)} chunks synthesized in {total_ms}ms "
+          f"(slowest chunk {max(t['ms'] for t in timings)}ms)")
+    return {
+        "provider": provider.name,
+        "deployment": provider.deployment,
+        "voice": provider.voice,
+        "chunks": timings,
+        "total_ms": total_ms
+    }
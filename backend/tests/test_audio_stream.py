@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.audio_stream import RangeNotSatisfiable, etag_matches, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=0-500", (0, 99)),
+    (None, None),
+    ("bytes=0-1,5-6", None),  # multi-range: full response
+    ("bytes=abc-", None),
+    ("bytes=9-2", None),  # last < first is invalid, so the header is ignored
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=150-200", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 100)
+
+
+def test_etag_matches_weak_and_wildcard():
+    assert etag_matches('W/"1-2", "3-4"', '"1-2"')
+    assert etag_matches("*", '"1-2"')
+    assert not etag_matches('"3-4"', '"1-2"')
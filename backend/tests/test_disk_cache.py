@@ -0,0 +1,38 @@
+import os
+import time
+
+from app.utils.disk_cache import DiskCache
+
+
+def _write(path, size: int, age: float = 0.0):
+    path.write_bytes(b"\0" * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+
+
+def test_eviction_keeps_in_flight_part_files(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=100, ttl_seconds=60)
+    done = cache.path_for("abc", ".mp3")
+    _write(done, 80, age=120)  # expired
+    part = tmp_path / "abc.mp3.0123456789ab.part"
+    _write(part, 500, age=120)  # still being written for the same key
+
+    cache.evict()
+
+    assert not done.exists()
+    assert part.exists()
+
+
+def test_delete_and_stats_ignore_part_files(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=1000)
+    _write(cache.path_for("abc", ".mp3"), 10)
+    part = tmp_path / "abc.mp3.0123456789ab.part"
+    _write(part, 300)
+
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["bytes"] == 10
+
+    cache.delete("abc")
+    assert part.exists()
+    assert cache.stats()["entries"] == 0
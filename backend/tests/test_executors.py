@@ -0,0 +1,46 @@
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+from app.utils import executors
+from app.utils.pdf_pipeline import extract_full_document_with_structure
+
+
+@pytest.fixture(autouse=True)
+def fresh_executors(monkeypatch):
+    # Stage semaphores belong to the event loop that created them; each test runs its own loop
+    monkeypatch.setattr(executors, "_stage_semaphores", {})
+    yield
+    executors.shutdown_executors()
+
+
+def _loaded_modules(_item) -> list:
+    """Runs in a pool worker: which heavy modules did the worker import?"""
+    heavy = ("sentence_transformers", "app.models.persona_analyzer", "app.api.routes")
+    return [name for name in heavy if name in sys.modules]
+
+
+def _crash_on(item):
+    if item == "crash":
+        os._exit(1)
+    return item
+
+
+def test_pool_workers_do_not_load_the_embedding_model(monkeypatch):
+    # Stand-in for the model module the API process has loaded; a forked worker would inherit it
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.ModuleType("sentence_transformers"))
+    results = asyncio.run(executors.map_in_process("pdf_parse", _loaded_modules, [0, 1]))
+    assert results == [[], []]
+
+
+def test_persona_parse_runs_from_the_light_pipeline_module():
+    assert extract_full_document_with_structure.__module__ == "app.utils.pdf_pipeline"
+
+
+def test_worker_crash_only_fails_the_crashing_item():
+    results = asyncio.run(executors.map_in_process("pdf_parse", _crash_on, ["a", "crash", "b"]))
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], Exception)
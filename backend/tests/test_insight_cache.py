@@ -0,0 +1,28 @@
+import sys
+import types
+
+import pytest
+
+
+@pytest.fixture
+def insight_cache(monkeypatch, tmp_path):
+    # llm_client needs the Gemini SDK; only its model name is used for the key
+    monkeypatch.setitem(sys.modules, "app.utils.llm_client", types.SimpleNamespace(GEMINI_MODEL="test-model"))
+    monkeypatch.setenv("INSIGHT_CACHE_DIR", str(tmp_path))
+    monkeypatch.delitem(sys.modules, "app.utils.insight_cache", raising=False)
+    import app.utils.insight_cache as module
+    return module
+
+
+def _snippet(unique_id: str, file_hash: str, section_index: int) -> dict:
+    return {"unique_id": unique_id, "file_hash": file_hash, "section_index": section_index,
+            "document_name": "report.pdf"}
+
+
+def test_same_pdf_in_another_session_shares_the_key(insight_cache):
+    selection = "Quarterly revenue grew by twelve percent"
+    first = insight_cache.insight_cache_key(selection, [_snippet("upload-1", "sha-a", 3)])
+    second = insight_cache.insight_cache_key(selection, [_snippet("upload-2", "sha-a", 3)])
+    other_pdf = insight_cache.insight_cache_key(selection, [_snippet("upload-3", "sha-b", 3)])
+    assert first == second
+    assert first != other_pdf